@@ -1,15 +1,18 @@
 import streamlit as st
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from gspread.exceptions import APIError
+from gspread.exceptions import APIError, WorksheetNotFound
 import pandas as pd
+import numpy as np
 import os
-import time
-import random
 from datetime import datetime, timedelta
-import unicodedata
-import threading
-import requests
+
+from sheets_async import run_async
+from sheets_parse import (CV_LABELS, REJECT_COLUMNS, TEXT, CvTab, alias_resolver, cv_rows, date_strings,
+                          parse_ledger_chunks)
+from sheets_io import (BREAKERS, CHANGES, FLIGHTS, HEDGES, LATENCY, LIMITER, METADATA_CACHE, OFFLINE_PARSE,
+                       STREAM_ROWS, append_only_ledger, append_parsed, background_refresher, batch_get_values,
+                       cached_batch_values, cached_workbook_values, is_rate_limited, label_rows, limited_call, open_worksheet,
+                       projected_reader, range_name, run_with_deadline, shared_client, shared_cv_tabs,
+                       sparse_tab_values, stream_tab)
 
 # ==========================================
 # 🔧 配置区域
@@ -38,6 +41,14 @@ SALES_SHEET_ID = '1jniQ-GpeMINjQMebniJ_J1eLVLQIR1NGbSjTtOFP9Q8'
 SALES_TAB_NAME = 'Positions'
 COMMISSION_SHEET_ID = '1A3K3RLlVNzCSCI-AkXAh8-K99gDSpCM7L9oNOCY0Obs'
 COMMISSION_TAB_NAME = 'Commission Detail'  # 专门存结果的标签页
+SHEETS_BACKEND = "threads"  # "threads"：线程池 + gspread；"async"：sheets_async 事件循环
+SALES_INGEST = "typed"  # "typed"：UNFORMATTED_VALUE + 日期序列号；"formatted"：和表格里显示的字符串一样
+SALES_DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%m/%d/%Y", "%d-%b-%y", "%Y.%m.%d"]
+SALES_COLUMNS = [
+    "Consultant", "GP", "Candidate Salary", "Percentage",
+    "Onboard Date Obj", "Onboard Date Str", "Payment Date",
+    "Payment Date Obj", "Status", "Quarter"
+]
 
 TEAM_CONFIG = [
     {"name": "Raul Solis", "id": "1vQuN-iNBRUug5J6gBMX-52jp6oogbA77SaeAf9j_zYs", "keyword": "Name",
@@ -48,6 +59,7 @@ TEAM_CONFIG = [
     {"name": "Karina Albarran", "id": "1zc4ghvfjIxH0eJ2aXfopOWHqiyTDlD8yFNjBzpH07D8", "keyword": "Name",
      "base_salary": 16500},
 ]
+CONSULTANTS = alias_resolver([c['name'] for c in TEAM_CONFIG])  # Positions 里的顾问名 -> TEAM_CONFIG 里的名字
 
 st.set_page_config(page_title="Management Dashboard", page_icon="💼", layout="wide")
 
@@ -63,22 +75,6 @@ st.markdown("""
     """, unsafe_allow_html=True)
 
 
-def keep_alive_worker():
-    app_url = st.secrets.get("public_url", None)
-    while True:
-        try:
-            time.sleep(300)
-            if app_url: requests.get(app_url, timeout=30)
-        except:
-            pass
-
-
-if 'keep_alive_started' not in st.session_state:
-    t = threading.Thread(target=keep_alive_worker, daemon=True)
-    t.start()
-    st.session_state['keep_alive_started'] = True
-
-
 # --- 🧮 辅助函数 ---
 def get_quarter_str(date_obj):
     if pd.isna(date_obj): return "Unknown"
@@ -86,6 +82,13 @@ def get_quarter_str(date_obj):
     return f"{date_obj.year} Q{q}"
 
 
+def quarter_strings(dates):
+    """get_quarter_str 的整列版本（datetime64 数组，没有 NaT）"""
+    years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    quarters = dates.astype("datetime64[M]").astype(np.int64) % 12 // 3 + 1
+    return np.strings.add(np.strings.add(years.astype(TEXT), " Q"), quarters.astype(TEXT)).astype(object)
+
+
 def calculate_commission_tier(total_gp, base_salary, is_team_lead=False):
     if is_team_lead:
         t1, t2, t3 = 4.5, 6.75, 11.25
@@ -135,216 +138,368 @@ def get_payout_date_from_month_key(month_key):
         return None
 
 
-def normalize_text(text):
-    return ''.join(c for c in unicodedata.normalize('NFD', str(text)) if unicodedata.category(c) != 'Mn').lower()
-
-
 def safe_api_call(func, *args, **kwargs):
     max_retries = 5
     for i in range(max_retries):
         try:
-            return func(*args, **kwargs)
+            return limited_call(func, *args, **kwargs)
         except APIError as e:
-            if "429" in str(e):
-                time.sleep(2 * (2 ** i) + random.uniform(0, 1))
+            if is_rate_limited(e):
+                continue  # 退避由共享限速器负责（含 Retry-After）
             else:
                 raise e
     return None
 
 
+def render_limiter_metrics():
+    m = LIMITER.snapshot()
+    with st.sidebar:
+        st.markdown("#### ⏱️ API Limiter")
+        st.metric("Rate (req/s)", m['rate'])
+        st.metric("Calls", m['calls'])
+        st.metric("429s", m['throttled'])
+        st.metric("Waited (s)", m['waited_s'])
+        st.metric("Shared fetches", FLIGHTS.shared)
+        st.metric("Hedged (won)", f"{HEDGES.hedged} ({HEDGES.wins})")
+        for endpoint, q in LATENCY.snapshot().items():
+            st.caption(f"{endpoint}: p50 {q['p50']}s · p95 {q['p95']}s · p99 {q['p99']}s (n={q['n']})")
+
+
+def render_refresh_status(feed, cache):
+    s = feed.status()
+    if s['last_error']:
+        st.caption(f"⚠️ Last background refresh failed: {s['last_error']}")
+    if cache:
+        st.caption(f"🕒 Data as of {cache['last_updated']} · auto refresh every {s['interval'] // 60} min")
+        stale = cache.get('stale') or {}
+        if stale:
+            st.warning("⚠️ Showing last good data for: " + ", ".join(
+                f"{k} (as of {v:%H:%M})" if v else f"{k} (no data yet)" for k, v in stale.items()))
+        rejects = cache.get('sales_rejects')
+        if rejects is not None and not rejects.empty:
+            with st.expander(f"⚠️ {len(rejects)} row(s) in {SALES_TAB_NAME} could not be read"):
+                st.dataframe(rejects, use_container_width=True, hide_index=True)
+    ambiguous = dict(CONSULTANTS.ambiguous)  # 后台刷新线程可能正在往里写
+    if ambiguous:
+        st.caption("⚠️ Ambiguous consultant names in Positions (first match used): " + "; ".join(
+            f"{raw} → {' / '.join(names)}" for raw, names in ambiguous.items()))
+    if BREAKERS.open_ids():
+        st.caption(f"🔌 Paused after repeated errors: {len(BREAKERS.open_ids())} sheet(s)")
+
+
 def connect_to_google():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
     if "gcp_service_account" in st.secrets:
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(st.secrets["gcp_service_account"]), scope)
-        return gspread.authorize(creds)
+        return shared_client(dict(st.secrets["gcp_service_account"]))
     return None
 
 
-def fetch_role_from_personal_sheet(client, sheet_id):
+def read_book_tabs(client, sheet_id, tabs):
+    """读多个整页（一次 batchGet，WORKBOOK_INGEST = "export" 时整本导出）；标签页不存在返回 []，其它失败直接抛异常
+    （失败结果不会进变更缓存）。整页不落盘：月份页的磁盘缓存是 shared_cv_tabs 存的解析用副本"""
+    titles = METADATA_CACHE.get(client, sheet_id)
+    if any(t not in titles for t in tabs):
+        titles = METADATA_CACHE.get(client, sheet_id, refresh=True)  # 可能是刚建的月份页
+    present = [t for t in tabs if t in titles]
+    rows = cached_workbook_values(client, sheet_id, [range_name(t) for t in present], lambda missing: safe_api_call(
+        batch_get_values, client, sheet_id, missing), safe_api_call, persist=()) if present else []
+    if rows is None:
+        raise RuntimeError("读取表格失败（重试次数用尽）")
+    found = dict(zip(present, rows))
+    return [found.get(t, []) for t in tabs]
+
+
+def read_book_label_rows(client, conf, tabs):
+    """parse_sheet_rows 只看第一格是公司 / 职位 / 关键字 / 阶段的行：建好清单后只读这些行（所有月份一次 batchGet），
+    第一次或布局变了才整页读（STREAM_ROWS > 0 时整页读也是分段读，只留下标签行）。
+    返回 [(行, 是否整页)]：整页读到的才能存成和 head.py 共用的副本"""
+    labels = CV_LABELS + [conf.get('keyword', 'Name')]
+    whole = set()
+
+    def read_full(full):
+        if STREAM_ROWS:
+            return [label_rows(stream_tab(client, conf['id'], t, safe_api_call), labels) for t in full]
+        whole.update(full)
+        return read_book_tabs(client, conf['id'], full)
+
+    rows = sparse_tab_values(client, conf['id'], tabs, labels, read_full, safe_api_call)
+    return [(r, t in whole) for t, r in zip(tabs, rows)]
+
+
+def read_role(client, sheet_id):
+    """Credentials!B1（先查磁盘缓存，OFFLINE_PARSE 时只用缓存）"""
     try:
-        sheet = safe_api_call(client.open_by_key, sheet_id)
-        ws = safe_api_call(sheet.worksheet, 'Credentials')
-        role = safe_api_call(ws.acell, 'B1').value
-        return role.strip() if role else "Consultant"
-    except:
+        open_worksheet(client, sheet_id, 'Credentials')
+    except WorksheetNotFound:
         return "Consultant"
+    values = cached_batch_values(client, sheet_id, [range_name('Credentials', 'B1')],
+                                 lambda missing: safe_api_call(batch_get_values, client, sheet_id, missing))
+    if values is None:
+        raise RuntimeError("读取 Credentials!B1 失败（重试次数用尽）")
+    role = values[0][0][0] if values[0] and values[0][0] else ""
+    return role.strip() or "Consultant"
+
 
+def fetch_role_from_personal_sheet(client, sheet_id):
+    return CHANGES.reuse(sheet_id, "role", lambda: read_role(client, sheet_id))
 
-def fetch_recruitment_stats(client, months):
+
+def assemble_recruitment_stats(months, per_book):
+    """per_book[顾问序号][月份序号] = (sent, int, off, details)"""
     all_stats, all_details = [], []
-    for month in months:
-        for consultant in TEAM_CONFIG:
-            s, i, o, d = internal_fetch_sheet_data(client, consultant, month)
+    for m_idx, month in enumerate(months):
+        for c_idx, consultant in enumerate(TEAM_CONFIG):
+            s, i, o, d = per_book[c_idx][m_idx]
             all_stats.append({"Consultant": consultant['name'], "Month": month, "Sent": s, "Int": i, "Off": o})
             if d: all_details.extend(d)
     return pd.DataFrame(all_stats), pd.DataFrame(all_details)
 
 
-def internal_fetch_sheet_data(client, conf, tab):
+def fetch_book_stats(client, conf, months):
+    """一本顾问表格所有月份的 (sent, int, off, details)；表格没变动时直接复用上次结果。
+    月份页的解析结果在本进程内共用（shared_cv_tabs）；和 head.py 共用 PAYLOAD_DIR 时，那边整页读过当前版本也不再请求。
+    失败时抛异常，由 run_with_deadline 换成上一次成功的结果"""
+    keyword = conf.get('keyword', 'Name')
+
+    def read_months():
+        cvs = shared_cv_tabs(client, conf['id'], months, keyword,
+                             lambda missing: read_book_label_rows(client, conf, missing),
+                             lambda rows: cv_rows(rows, keyword), lambda rows: CvTab(rows, keyword))
+        return [parse_sheet_rows(conf, m, cv) for m, cv in zip(months, cvs)]
+
+    return CHANGES.reuse(conf['id'], ("stats", tuple(months)), read_months)
+
+
+def parse_sheet_rows(conf, tab, cv):
+    """CvTab -> (sent, int, off, details)"""
     try:
-        sheet = safe_api_call(client.open_by_key, conf['id'])
-        ws = safe_api_call(sheet.worksheet, tab)
-        rows = safe_api_call(ws.get_all_values)
-        details, cs, ci, co = [], 0, 0, 0
-        target_key = conf.get('keyword', 'Name')
-        COMPANY_KEYS, POSITION_KEYS, STAGE_KEYS = ["Company", "Client", "Cliente", "公司", "公司名称", "客户"], [
-            "Position", "Role",
-            "职位"], ["Stage",
-                      "Status",
-                      "阶段"]
-        block = {"c": "Unk", "p": "Unk", "cands": {}}
-
-        def flush(b):
-            res = []
-            nonlocal cs, ci, co
-            for _, c_data in b['cands'].items():
-                if not c_data.get('n'): continue
-                stage = str(c_data.get('s', 'Sent')).lower()
-                is_off = "offer" in stage
-                is_int = ("interview" in stage) or ("面试" in stage) or is_off
-                if is_off: co += 1
-                if is_int: ci += 1
-                cs += 1
-                stat = "Offered" if is_off else ("Interviewed" if is_int else "Sent")
-                res.append(
-                    {"Consultant": conf['name'], "Month": tab, "Company": b['c'], "Position": b['p'], "Status": stat,
-                     "Count": 1})
-            return res
-
-        for r in rows:
-            if not r: continue
-            fc = r[0].strip()
-            if fc in COMPANY_KEYS:
-                details.extend(flush(block));
-                block = {"c": r[1] if len(r) > 1 else "Unk", "p": "Unk", "cands": {}}
-            elif fc in POSITION_KEYS:
-                block['p'] = r[1] if len(r) > 1 else "Unk"
-            elif fc == target_key:
-                for idx, v in enumerate(r[1:], 1):
-                    if v.strip():
-                        if idx not in block['cands']: block['cands'][idx] = {}
-                        block['cands'][idx]['n'] = v.strip()
-            elif fc in STAGE_KEYS:
-                for idx, v in enumerate(r[1:], 1):
-                    if v.strip():
-                        if idx not in block['cands']: block['cands'][idx] = {}
-                        block['cands'][idx]['s'] = v.strip()
-        details.extend(flush(block))
-        return cs, ci, co, details
+        return cv.funnel(conf['name'], tab)
     except:
         return 0, 0, 0, []
 
 
 def fetch_all_sales_data(client):
-    # 定义保底列名，防止后续代码报 KeyError
-    columns = [
-        "Consultant", "GP", "Candidate Salary", "Percentage",
-        "Onboard Date Obj", "Onboard Date Str", "Payment Date",
-        "Payment Date Obj", "Status", "Quarter"
-    ]
-    try:
-        sheet = safe_api_call(client.open_by_key, SALES_SHEET_ID)
-        ws = safe_api_call(sheet.worksheet, SALES_TAB_NAME)
-        rows = safe_api_call(ws.get_all_values)
-
-        col_cons, col_onboard, col_pay, col_sal, col_pct = -1, -1, -1, -1, -1
-        sales_records = []
-        found_header = False
-        date_formats = ["%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%m/%d/%Y", "%d-%b-%y", "%Y.%m.%d"]
-
-        for row in rows:
-            if not any(cell.strip() for cell in row): continue
-            row_lower = [str(x).strip().lower() for x in row]
-
-            if not found_header:
-                # 只要一行里同时出现了 "consultant" 和 "onboarding" 就判定为表头
-                if any("consultant" in c for c in row_lower) and any("onboarding" in c for c in row_lower):
-                    for idx, cell in enumerate(row_lower):
-                        if "consultant" in cell: col_cons = idx
-                        if "onboarding" in cell and "date" in cell: col_onboard = idx
-                        if "candidate" in cell and "salary" in cell: col_sal = idx
-                        if "payment" in cell and "date" in cell: col_pay = idx
-                        if "percentage" in cell or cell == "%" or "pct" in cell: col_pct = idx
-                    found_header = True
-                    continue
-
-            if found_header:
-                if "POSITION" in " ".join(row_lower).upper() and "PLACED" not in " ".join(row_lower).upper(): break
-                if len(row) <= max(col_cons, col_onboard): continue
-
-                consultant_name = row[col_cons].strip()
-                if not consultant_name: continue
-
-                onboard_date = None
-                for fmt in date_formats:
-                    try:
-                        onboard_date = datetime.strptime(row[col_onboard].strip(), fmt)
-                        break
-                    except:
-                        pass
-                if not onboard_date: continue
-
-                matched = "Unknown"
-                c_norm = normalize_text(consultant_name)
-                for conf in TEAM_CONFIG:
-                    conf_norm = normalize_text(conf['name'])
-                    if conf_norm in c_norm or c_norm in conf_norm:
-                        matched = conf['name']
-                        break
-                if matched == "Unknown": continue
+    return CHANGES.reuse(SALES_SHEET_ID, "sales", lambda: read_sales_ledger(client))
+
+
+def locate_sales_columns(rows):
+    """找表头行和 parse_sales_rows 用到的列；表头以下出现 POSITION / PLACED 的列也一起读（结束标记）。
+    第 4 项：表头以下还没有结束标记时台账只在底部追加，可以增量读取；
+    第 5 项：老的行里也会被填写 / 修改的列（付款日期、提成比例），增量读取时整列核对；
+    第 6 项：typed 读取时也按显示的文本读的列（提成比例，口径见 ProjectedReader）"""
+    for h, row in enumerate(rows):
+        row_lower = [str(x).strip().lower() for x in row]
+        if any("consultant" in c for c in row_lower) and any("onboarding" in c for c in row_lower):
+            cols, date_cols, watch, pct = set(), set(), set(), set()
+            for idx, cell in enumerate(row_lower):
+                if ("onboarding" in cell and "date" in cell) or ("payment" in cell and "date" in cell):
+                    date_cols.add(idx)
+                if "percentage" in cell or cell == "%" or "pct" in cell:
+                    pct.add(idx)
+                if ("payment" in cell and "date" in cell) or idx in pct:
+                    watch.add(idx)
+                if ("consultant" in cell or ("candidate" in cell and "salary" in cell)
+                        or "percentage" in cell or cell == "%" or "pct" in cell):
+                    cols.add(idx)
+            cols |= date_cols
+            ended = False
+            for r in rows[h + 1:]:
+                for idx, cell in enumerate(r):
+                    if "POSITION" in str(cell).upper() or "PLACED" in str(cell).upper():
+                        cols.add(idx)
+                joined = " ".join(str(x).strip() for x in r).upper()
+                ended = ended or ("POSITION" in joined and "PLACED" not in joined)
+            return h, cols, date_cols, not ended, watch, pct
+    return None
 
-                try:
-                    salary = float(str(row[col_sal]).replace(',', '').replace('$', '').strip())
-                except:
-                    salary = 0
-
-                pct_val = 1.0
-                if col_pct != -1 and len(row) > col_pct:
-                    try:
-                        p_str = str(row[col_pct]).replace('%', '').strip()
-                        p_float = float(p_str)
-                        pct_val = p_float / 100.0 if p_float > 1.0 else p_float
-                    except:
-                        pct_val = 1.0
-
-                calc_gp = salary * (1.0 if salary < 20000 else 1.5) * pct_val
-
-                pay_date_obj, status = None, "Pending"
-                if col_pay != -1 and len(row) > col_pay:
-                    pay_str = row[col_pay].strip()
-                    if len(pay_str) > 5:
-                        status = "Paid"
-                        for fmt in date_formats:
-                            try:
-                                pay_date_obj = datetime.strptime(pay_str, fmt)
-                                break
-                            except:
-                                pass
-
-                sales_records.append({
-                    "Consultant": matched, "GP": calc_gp, "Candidate Salary": salary, "Percentage": pct_val,
-                    "Onboard Date Obj": onboard_date, "Onboard Date Str": onboard_date.strftime("%Y-%m-%d"),
-                    "Payment Date": row[col_pay].strip() if col_pay != -1 and len(row) > col_pay else "",
-                    "Payment Date Obj": pay_date_obj, "Status": status, "Quarter": get_quarter_str(onboard_date)
-                })
-
-        if not sales_records:
-            return pd.DataFrame(columns=columns)
-        return pd.DataFrame(sales_records)
-    except Exception as e:
-        return pd.DataFrame(columns=columns)
+
+def read_sales_ledger(client):
+    """Positions 页只按列读取需要的几列（表头变了会自动整页重读）；typed 模式下日期 / 数字按原始值读取。
+    台账只在底部追加：只读上次之后新增的行，解析后接到上次的结果后面。返回 (DataFrame, 拒收行)。
+    STREAM_ROWS > 0 时改成分段读取整页、边读边解析（不做增量读取：末尾指纹要用到整页的列）"""
+    if STREAM_ROWS:
+        return parse_sales_chunks(stream_tab(client, SALES_SHEET_ID, SALES_TAB_NAME, safe_api_call,
+                                             typed=SALES_INGEST == "typed", locate=locate_sales_columns))
+    reader = projected_reader(SALES_SHEET_ID, SALES_TAB_NAME, locate_sales_columns, typed=SALES_INGEST == "typed")
+    parsed = append_only_ledger(("sales", SALES_TAB_NAME), reader).refresh(client, safe_api_call, parse_sales_rows,
+                                                                          append_parsed)
+    if parsed is None:
+        raise RuntimeError(f"读取 {SALES_TAB_NAME} 失败（重试次数用尽）")
+    return parsed
+
+
+def sales_header(row):
+    """Positions 的表头行 -> parse_ledger 用的列号；不是表头时 None"""
+    row_lower = [str(x).strip().lower() for x in row]
+    # 只要一行里同时出现了 "consultant" 和 "onboarding" 就判定为表头
+    if not (any("consultant" in c for c in row_lower) and any("onboarding" in c for c in row_lower)):
+        return None
+    cols = {"consultant": -1, "onboard": -1, "salary": -1, "pct": -1, "payment": -1}
+    for idx, cell in enumerate(row_lower):
+        if "consultant" in cell: cols["consultant"] = idx
+        if "onboarding" in cell and "date" in cell: cols["onboard"] = idx
+        if "candidate" in cell and "salary" in cell: cols["salary"] = idx
+        if "payment" in cell and "date" in cell: cols["payment"] = idx
+        if "percentage" in cell or cell == "%" or "pct" in cell: cols["pct"] = idx
+    return cols
+
+
+def parse_sales_rows(rows):
+    """Positions 台账 -> (SALES_COLUMNS 的 DataFrame, 没解析进来的行)"""
+    return parse_sales_chunks([rows])
+
+
+def parse_sales_chunks(chunks):
+    """按段给出的 Positions 台账（可以是 stream_tab 的生成器）整列解析，见 sheets_parse.parse_ledger_chunks"""
+    led, rejects = parse_ledger_chunks(chunks, sales_header, ("consultant", "onboard"), SALES_DATE_FORMATS,
+                                       (",", "$"), CONSULTANTS.resolve, payment_dates=True)
+    if led is None or not len(led["consultant"]):
+        return pd.DataFrame(columns=SALES_COLUMNS), rejects
+    pay = led["pay_date"]
+    return pd.DataFrame({
+        "Consultant": led["consultant"], "GP": led["gp"], "Candidate Salary": led["salary"],
+        "Percentage": led["pct"], "Onboard Date Obj": led["onboard"], "Onboard Date Str": date_strings(led["onboard"]),
+        "Payment Date": led["pay_text"],
+        # 一个付款日期都没有时和原来一样是全 None 的 object 列
+        "Payment Date Obj": pay if (~np.isnat(pay)).any() else np.full(len(pay), None, dtype=object),
+        "Status": np.where(led["paid"], "Paid", "Pending").astype(object), "Quarter": quarter_strings(led["onboard"])
+    }), rejects
+
+
+async def load_book_async(ac, conf, months):
+    """一本顾问表格：1次元数据 + 1次 batchGet（Credentials!B1 + 需要的月份页）；失败时抛异常"""
+    sheet = await ac.open_by_key(conf['id'])
+    titles = [w.title for w in await sheet.worksheets()]
+    present = [m for m in months if m in titles]
+    has_role = 'Credentials' in titles
+    ranges = ([range_name('Credentials', 'B1')] if has_role else []) + [range_name(m) for m in present]
+    values = await sheet.values_batch_get(ranges)
+    role = "Consultant"
+    if has_role:
+        cell = values.pop(0)
+        if cell and cell[0][0].strip(): role = cell[0][0].strip()
+    keyword = conf.get('keyword', 'Name')
+    parsed = {m: parse_sheet_rows(conf, m, CvTab(rows, keyword)) for m, rows in zip(present, values)}
+    return role, [parsed.get(m, (0, 0, 0, [])) for m in months]
+
+
+async def load_sales_async(ac):
+    sheet = await ac.open_by_key(SALES_SHEET_ID)
+    ws = await sheet.worksheet(SALES_TAB_NAME)
+    return parse_sales_rows(await ws.get_all_values())
+
+
+def book_source(client, conf, months):
+    """一本顾问表格的 (role, 各月份统计)，SHEETS_BACKEND 决定走线程池还是事件循环；表格没变动时直接复用上次结果"""
+    if SHEETS_BACKEND == "async" and not OFFLINE_PARSE:  # 离线时走带磁盘缓存的同步路径
+        return CHANGES.reuse(conf['id'], ("book", tuple(months)),
+                             lambda: run_async(load_book_async, client.http_client.auth, conf, months))
+    return fetch_role_from_personal_sheet(client, conf['id']), fetch_book_stats(client, conf, months)
+
+
+def sales_source(client):
+    if SHEETS_BACKEND == "async" and not OFFLINE_PARSE:
+        return CHANGES.reuse(SALES_SHEET_ID, "sales", lambda: run_async(load_sales_async, client.http_client.auth))
+    return fetch_all_sales_data(client)
 
 
 def load_data_from_api(client, quanbu):
-    team_data = []
+    """多个经理同时点 REFRESH 时只跑一次完整刷新，所有会话共用结果（每个会话各自的等待超时）"""
+    return dict(FLIGHTS.do(("supervisor-refresh", SHEETS_BACKEND, tuple(quanbu)),
+                           lambda: fetch_data_from_api(client, quanbu)))
+
+
+def fetch_data_from_api(client, quanbu):
+    # 先问一次 Drive 哪些表格变了；一次都没变的刷新只花 1~2 次请求
+    CHANGES.poll(client, [c['id'] for c in TEAM_CONFIG] + [SALES_SHEET_ID])
+    # 每本顾问表格 + 销售表各一个任务，总耗时不超过 REFRESH_DEADLINE；超时 / 失败的用上一次成功的结果
+    book_key = ("book", tuple(quanbu))
+    tasks = {(c['id'], book_key): (lambda c=c: book_source(client, c, quanbu)) for c in TEAM_CONFIG}
+    tasks[(SALES_SHEET_ID, "sales")] = lambda: sales_source(client)
+    results, stale = run_with_deadline(tasks)
+    team_data, per_book = [], []
     for conf in TEAM_CONFIG:
+        role, stats = results[(conf['id'], book_key)] or ("Consultant", [(0, 0, 0, [])] * len(quanbu))
         member = conf.copy()
-        member['role'] = fetch_role_from_personal_sheet(client, conf['id'])
+        member['role'] = role
         team_data.append(member)
-    rec_stats_df, rec_details_df = fetch_recruitment_stats(client, quanbu)
-    all_sales_df = fetch_all_sales_data(client)
+        per_book.append(stats)
+    # 按 月份 × 顾问 的原顺序拼回去
+    rec_stats_df, rec_details_df = assemble_recruitment_stats(quanbu, per_book)
+    # 保底列名，防止后续代码报 KeyError
+    all_sales_df, sales_rejects = (results[(SALES_SHEET_ID, "sales")]
+                                   or (pd.DataFrame(columns=SALES_COLUMNS), pd.DataFrame(columns=REJECT_COLUMNS)))
+    names = {c['id']: c['name'] for c in TEAM_CONFIG}
+    names[SALES_SHEET_ID] = "Sales"
     return {"team_data": team_data, "rec_stats": rec_stats_df, "rec_details": rec_details_df,
-            "rec_hist": pd.DataFrame(), "sales_all": all_sales_df, "last_updated": datetime.now().strftime("%H:%M:%S")}
+            "rec_hist": pd.DataFrame(), "sales_all": all_sales_df, "sales_rejects": sales_rejects,
+            "last_updated": datetime.now().strftime("%H:%M:%S"), "stale": {names[k[0]]: as_of for k, as_of in stale.items()}}
+
+
+# --- 🔄 同步佣金结果到游戏看板 ---
+COMMISSION_HEADER = ['Consultant', 'Month', 'Final_Commission', 'Last_Updated']
+
+
+def _cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {"userEnteredValue": {"numberValue": float(value)}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def _update_cells(sheet_gid, row_idx, col_idx, values):
+    return {"updateCells": {"rows": [{"values": [_cell(v) for v in values]}], "fields": "userEnteredValue",
+                            "start": {"sheetId": sheet_gid, "rowIndex": row_idx, "columnIndex": col_idx}}}
+
+
+def _same_amount(old, new):
+    try:
+        return abs(float(str(old).replace(",", "")) - float(new)) < 0.005
+    except ValueError:
+        return False
+
+
+def plan_commission_upsert(existing, sheet_gid, rows, now_str):
+    """按 (Consultant, Month) 对比现有内容，只生成变了的单元格；其它月份的历史行保持不动。
+    existing 是标签页当前的 get_all_values()，rows 是 [(Consultant, Month, 金额)]"""
+    requests_ = []
+    if not existing or existing[0][:len(COMMISSION_HEADER)] != COMMISSION_HEADER:
+        requests_.append(_update_cells(sheet_gid, 0, 0, COMMISSION_HEADER))
+    positions = {}
+    for idx, r in enumerate(existing[1:], start=1):
+        if len(r) >= 2:
+            positions.setdefault((r[0].strip(), r[1].strip()), idx)
+    new_rows, updated = [], 0
+    for name, month, amt in rows:
+        idx = positions.get((name, month))
+        if idx is None:
+            new_rows.append([name, month, amt, now_str])
+        elif not _same_amount(existing[idx][2] if len(existing[idx]) > 2 else "", amt):
+            requests_.append(_update_cells(sheet_gid, idx, 2, [amt, now_str]))
+            updated += 1
+    if new_rows:
+        # appendCells 接在最后一行数据后面，行数不够时自动扩展
+        requests_.append({"appendCells": {"sheetId": sheet_gid, "fields": "userEnteredValue",
+                                          "rows": [{"values": [_cell(v) for v in r]} for r in new_rows]}})
+    return requests_, updated, len(new_rows)
+
+
+def sync_commission_rows(client, rows):
+    """读一次现有标签页，变化的单元格放进一个 spreadsheets.batchUpdate（整体成功或整体失败）；
+    返回 (更新行数, 新增行数)"""
+    try:
+        ws = open_worksheet(client, COMMISSION_SHEET_ID, COMMISSION_TAB_NAME)
+    except WorksheetNotFound:
+        ws = client.open_by_key(COMMISSION_SHEET_ID).add_worksheet(title=COMMISSION_TAB_NAME, rows="100", cols="5")
+        METADATA_CACHE.invalidate(COMMISSION_SHEET_ID)
+    existing = safe_api_call(ws.get_all_values)
+    if existing is None:
+        raise RuntimeError("读取佣金标签页失败（重试次数用尽）")
+    now_str = datetime.now().strftime("%Y-%m-%d %H:%M")
+    requests_, updated, added = plan_commission_upsert(existing, ws.id, rows, now_str)
+    if requests_:
+        if safe_api_call(client.http_client.batch_update, COMMISSION_SHEET_ID, {"requests": requests_}) is None:
+            raise RuntimeError("写入佣金标签页失败（重试次数用尽）")
+        CHANGES.mark_changed([COMMISSION_SHEET_ID])
+    return updated, added
 
 
 def main():
@@ -352,17 +507,32 @@ def main():
     client = connect_to_google()
     if not client: st.error("❌ API Error"); return
 
+    # 进程级后台刷新：所有会话读同一份数据，打开页面不用再等 REFRESH
+    feed = background_refresher("supervisor")
+    cache = feed.read(lambda: load_data_from_api(client, quanbu))
+
     col1, col2 = st.columns([1, 5])
     with col1:
         if st.button("🔄 REFRESH DATA", type="primary"):
             with st.spinner("⏳ Fetching ..."):
-                data_package = load_data_from_api(client, quanbu)
-                st.session_state['data_cache'] = data_package
-                st.rerun()
-
-    if 'data_cache' not in st.session_state: st.stop()
+                try:
+                    feed.publish(load_data_from_api(client, quanbu))
+                except TimeoutError:
+                    st.error("⏳ Another refresh is still running, please try again shortly.")
+                else:
+                    st.rerun()
+
+    render_limiter_metrics()
+    if cache is None:
+        with st.spinner("⏳ Fetching ..."):
+            try:
+                cache = feed.wait()
+            except TimeoutError:
+                pass
+    with col2:
+        render_refresh_status(feed, cache)
+    if cache is None: st.stop()
 
-    cache = st.session_state['data_cache']
     dynamic_team_config = cache['team_data']
     rec_stats_df, all_sales_df = cache['rec_stats'], cache['sales_all']
     sales_df_2q = all_sales_df[
@@ -713,26 +883,16 @@ def main():
         st.divider()
         if st.button("🌟 Confirm Sync to Google Sheets", type="primary", use_container_width=True):
             try:
-                # Prepare list for gspread
-                data_to_save = []
-                now_str = datetime.now().strftime("%Y-%m-%d %H:%M")
-                for _, row in preview_df.iterrows():
-                    data_to_save.append([row['Consultant'], row['Month'], row['Total_Commission'], now_str])
-
-                # Connect to Sheet
-                sum_sheet = client.open_by_key(COMMISSION_SHEET_ID)
-                try:
-                    ws_summary = sum_sheet.worksheet(COMMISSION_TAB_NAME)
-                except:
-                    ws_summary = sum_sheet.add_worksheet(title=COMMISSION_TAB_NAME, rows="100", cols="5")
-
-                # Update Sheet
-                ws_summary.clear()
-                ws_summary.update('A1', [['Consultant', 'Month', 'Final_Commission', 'Last_Updated']])
-                ws_summary.update('A2', data_to_save)
-
-                st.success(f"✨ Sync Successful! Data has been updated to Google Sheet.")
-                st.balloons()
+                # Upsert by (Consultant, Month): only changed cells are written, older months are kept
+                data_to_save = [(str(row['Consultant']), str(row['Month']), float(row['Total_Commission']))
+                                for _, row in preview_df.iterrows()]
+                updated, added = sync_commission_rows(client, data_to_save)
+
+                if updated or added:
+                    st.success(f"✨ Sync Successful! {updated} updated, {added} added.")
+                    st.balloons()
+                else:
+                    st.success("✅ Google Sheet is already up to date.")
             except Exception as e:
                 st.error(f"❌ An error occurred during sync: {e}")
 
@@ -1,13 +1,20 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
-import re
+import numpy as np
 import time
 from datetime import datetime, timedelta
-import unicodedata
-import random
+from itertools import chain
+from gspread.utils import numericise_all, to_records
+
+from sheets_async import run_async
+from sheets_parse import REJECT_COLUMNS, AliasResolver, CvTab, alias_resolver, cv_rows, fold_name, parse_ledger_chunks
+from sheets_store import ARCHIVE, archive_cutoff
+from sheets_io import (BREAKERS, CHANGES, FLIGHTS, HEDGES, LATENCY, LIMITER, OFFLINE_PARSE, STREAM_ROWS,
+                       DeadlineExceeded, append_only_ledger, append_parsed, background_refresher, cached_values,
+                       cached_workbook_values, get_tabs, is_rate_limited, limited_call, open_worksheet,
+                       month_tabs, projected_reader, range_name, batch_get_values, run_with_deadline, shared_client,
+                       shared_cv_tabs, stream_tab)
 
 # ==========================================
 # 🔧 配置区域
@@ -43,15 +50,18 @@ TEAM_CONFIG_TEMPLATE = [
         "base_salary": 15000
     },
 ]
+CONSULTANTS = alias_resolver([t["name"] for t in TEAM_CONFIG_TEMPLATE])  # 销售表里的顾问名 -> 名单里的名字
 
 QUARTERLY_INDIVIDUAL_GOAL = 87
 QUARTERLY_GOAL_INTERN = 87
 MONTHLY_GOAL = 116
 QUARTERLY_TEAM_GOAL = 348
 
-API_DELAY_BASE = 0.5
-API_DELAY_JITTER = 0.3
 MAX_RETRIES = 5
+SHEETS_BACKEND = "threads"  # "threads"：线程池 + gspread；"async"：sheets_async 事件循环
+SALES_INGEST = "typed"  # "typed"：UNFORMATTED_VALUE + 日期序列号；"formatted"：和表格里显示的字符串一样
+FINANCIAL_DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%m/%d/%Y", "%d-%b-%y"]
+DEFAULT_ROLE = ("Full-Time", False, "Consultant")
 
 # ==========================================
 
@@ -298,22 +308,16 @@ st.markdown("""
 # ==========================================
 # 🧮 工具函数
 # ==========================================
-def exponential_backoff(retry_count):
-    delay = (2 ** retry_count) * API_DELAY_BASE + random.uniform(0, API_DELAY_JITTER)
-    return min(delay, 10)
-
-
 def safe_google_api_call(func, *args, **kwargs):
     for retry in range(MAX_RETRIES):
         try:
-            time.sleep(API_DELAY_BASE + random.uniform(0, API_DELAY_JITTER))
-            return func(*args, **kwargs)
+            return limited_call(func, *args, **kwargs)
         except Exception as e:
-            if "429" in str(e) or "quota" in str(e).lower() or "limit" in str(e).lower():
-                wait = exponential_backoff(retry)
-                # st.warning(f"API限流，{wait:.1f}秒后重试 ({retry + 1}/{MAX_RETRIES})")
-                time.sleep(wait)
+            if is_rate_limited(e):
+                # 限速器已降速并记下冷却时间（含 Retry-After），下一次 acquire 会自动等待
                 continue
+            elif isinstance(e, DeadlineExceeded):
+                raise
             else:
                 st.error(f"API失败: {str(e)}")
                 return None
@@ -324,8 +328,7 @@ def safe_google_api_call(func, *args, **kwargs):
 def normalize_text(text):
     if pd.isna(text):
         return ""
-    return ''.join(c for c in unicodedata.normalize('NFD', str(text))
-                   if unicodedata.category(c) != 'Mn').lower()
+    return fold_name(text)
 
 
 def calculate_commission_tier(total_gp, base_salary, is_team_lead=False):
@@ -360,44 +363,59 @@ def is_qualified_by_quarter(role, cv_qtr, gp_qtr, base_salary, is_team_lead):
 # ==========================================
 # 🧮 佣金：直接从指定Sheet读取（不再计算）
 # ==========================================
-def get_commission_from_sheet(client, consultant_name):
-    """直接从 1A3K3RLlVNzCSCI-AkXAh8-K99gDSpCM7L9oNOCY0Obs 读取佣金"""
-    try:
-        sheet = safe_google_api_call(client.open_by_key, COMMISSION_SUMMARY_ID)
-        ws = safe_google_api_call(sheet.worksheet, COMMISSION_TAB_NAME)
-        data = safe_google_api_call(ws.get_all_records)
-        df = pd.DataFrame(data)
-
-        if df.empty:
-            return 0.0
-
-        # 模糊匹配顾问姓名
+def read_commission_records(client):
+    """和 get_all_records 一样的记录列表；整页先查磁盘缓存（OFFLINE_PARSE 时只用缓存）"""
+    ws = open_worksheet(client, COMMISSION_SUMMARY_ID, COMMISSION_TAB_NAME)
+    rows = cached_values(client, COMMISSION_SUMMARY_ID, range_name(COMMISSION_TAB_NAME),
+                         lambda: safe_google_api_call(ws.get_all_values))
+    if rows is None:
+        raise RuntimeError("读取佣金表失败")
+    return to_records(rows[0], [numericise_all(r) for r in rows[1:]]) if rows else []
+
+
+class CommissionIndex:
+    """Commission Detail 整页读一次，每个规范化姓名只留最新月份的 Final_Commission，
+    按月份从新到旧建子串索引（AliasResolver）"""
+
+    def __init__(self, records):
+        self.names = AliasResolver([], normalize_text)
+        self.commission = []  # 和 self.names.names 对应，越靠前月份越新
+        self._memo = {}
+        df = pd.DataFrame(records)
+        if df.empty or "Consultant" not in df.columns:
+            return
+        folded = {n: normalize_text(n) for n in df["Consultant"].unique()}  # 每种写法只规范化一次
+        df["name_norm"] = df["Consultant"].map(folded)
+        df["Month"] = pd.to_datetime(df["Month"], errors='coerce') if "Month" in df.columns else pd.NaT
+        df = df.sort_values("Month", ascending=False, kind="stable").drop_duplicates("name_norm")
+        comm = df["Final_Commission"] if "Final_Commission" in df.columns else pd.Series(0.0, index=df.index)
+        self.names = AliasResolver(df["name_norm"].tolist(), lambda n: n)
+        self.commission = list(comm)
+
+    def get(self, consultant_name):
+        """模糊匹配顾问姓名（表里的名字包含它即可），取最新的 Final_Commission"""
         n_norm = normalize_text(consultant_name)
-        df["name_norm"] = df["Consultant"].apply(normalize_text)
-        match_row = df[df["name_norm"].str.contains(n_norm) | (df["name_norm"] == n_norm)]
-
-        if match_row.empty:
+        if n_norm not in self._memo:
+            hits = self.names.containing(n_norm)
+            self._memo[n_norm] = self.commission[hits[0]] if hits else 0.0
+        try:
+            return float(self._memo[n_norm])
+        except (TypeError, ValueError):
             return 0.0
 
-        # 取最新的Final_Commission
-        match_row["Month"] = pd.to_datetime(match_row["Month"], errors='coerce')
-        latest_row = match_row.sort_values("Month", ascending=False).iloc[0]
-        return float(latest_row.get("Final_Commission", 0.0))
-    except Exception as e:
-        st.warning(f"读取{consultant_name}佣金失败: {str(e)}")
-        return 0.0
+
+def load_commission_index(client):
+    """直接从 1A3K3RLlVNzCSCI-AkXAh8-K99gDSpCM7L9oNOCY0Obs 读取佣金；表格没变就复用上次的索引"""
+    return CHANGES.reuse(COMMISSION_SUMMARY_ID, "index", lambda: CommissionIndex(read_commission_records(client)))
 
 
 # ==========================================
 # 🔗 Google 连接
 # ==========================================
 def connect_to_google():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
     try:
         if "gcp_service_account" in st.secrets:
-            creds_dict = dict(st.secrets["gcp_service_account"])
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-            return safe_google_api_call(gspread.authorize, creds)
+            return shared_client(dict(st.secrets["gcp_service_account"]))
         else:
             st.error("未配置GCP密钥")
             return None
@@ -417,173 +435,210 @@ def get_quarter_info():
     return qtr_tabs, q, s, e, y
 
 
-def get_all_month_tabs(client, cfg):
-    try:
-        sheet = safe_google_api_call(client.open_by_key, cfg["id"])
-        if not sheet:
-            return []
-        titles = safe_google_api_call(lambda: [w.title for w in sheet.worksheets()])
-        valid = [t for t in titles if re.fullmatch(r"\d{6}", t)]
-        valid.sort()
-        return valid
-    except:
-        return []
-
-
-def fetch_role(client, sheet_id):
-    try:
-        sheet = safe_google_api_call(client.open_by_key, sheet_id)
-        if not sheet:
-            return "Full-Time", False, "Consultant"
-        try:
-            ws = safe_google_api_call(sheet.worksheet, "Credentials")
-        except:
-            ws = safe_google_api_call(sheet.get_worksheet, 0)
-        if not ws:
-            return "Full-Time", False, "Consultant"
-        rng = safe_google_api_call(ws.range, "A1:B1")
-        if not rng:
-            return "Full-Time", False, "Consultant"
-        a1 = rng[0].value.strip().lower()
-        b1 = rng[1].value.strip()
-        title = b1 if "title" in a1 else "Consultant"
-        is_intern = "intern" in title.lower()
-        is_lead = "team lead" in title.lower() or "manager" in title.lower()
-        role = "Intern" if is_intern else "Full-Time"
-        return role, is_lead, title.title()
-    except:
-        return "Full-Time", False, "Consultant"
-
-
-def fetch_cv_one_month(client, cfg, month_tab):
-    sid = cfg["id"]
-    key = cfg.get("keyword", "Name")
-    comp = ["Company", "Client", "Cliente", "公司名称", "客户"]
-    pos = ["Position", "Role", "Posición", "职位", "岗位"]
-    try:
-        sheet = safe_google_api_call(client.open_by_key, sid)
-        ws = safe_google_api_call(sheet.worksheet, month_tab)
-        if not ws:
-            return 0, []
-        rows = safe_google_api_call(ws.get_all_values)
-        cnt = 0
-        det = []
-        curr_c = "Unknown"
-        curr_p = "Unknown"
-        for r in rows:
-            if not r:
-                continue
-            cl = [str(x).strip() for x in r]
-            try:
-                i = cl.index(key)
-                cs = [x for x in cl[i + 1:] if x]
-                cnt += len(cs)
-                for _ in cs:
-                    det.append({
-                        "Consultant": cfg["name"],
-                        "Company": curr_c,
-                        "Position": curr_p,
-                        "Month": month_tab,
-                        "Count": 1  # 修复KeyError：添加Count列
-                    })
-            except ValueError:
-                if cl and cl[0] in comp:
-                    curr_c = cl[1] if len(cl) > 1 else "Unknown"
-                elif cl and cl[0] in pos:
-                    curr_p = cl[1] if len(cl) > 1 else "Unknown"
-        return cnt, det
-    except:
-        return 0, []
+def parse_role(a1, b1):
+    a1 = str(a1).strip().lower()
+    b1 = str(b1).strip()
+    title = b1 if "title" in a1 else "Consultant"
+    is_intern = "intern" in title.lower()
+    is_lead = "team lead" in title.lower() or "manager" in title.lower()
+    role = "Intern" if is_intern else "Full-Time"
+    return role, is_lead, title.title()
+
+
+def parse_cv_rows(cfg, month_tab, rows):
+    return CvTab(rows, cfg.get("keyword", "Name")).counts(cfg["name"], month_tab)
+
+
+def workbook_ranges(titles, closed=()):
+    """返回 (月份标签页, 读 role 的标签页, batchGet 区域列表)；已归档的月份不再读取"""
+    mons = [m for m in month_tabs(titles) if m not in closed]
+    role_tab = "Credentials" if "Credentials" in titles else (titles[0] if titles else None)
+    ranges = [range_name(m) for m in mons]
+    if role_tab:
+        ranges.insert(0, range_name(role_tab, "A1:B1"))
+    return mons, role_tab, ranges
+
+
+def workbook_role(head_rows):
+    """A1:B1 读到的内容 -> (role, is_lead, title)"""
+    if not head_rows:
+        return DEFAULT_ROLE
+    a1b1 = head_rows[0] + ["", ""]
+    return parse_role(a1b1[0], a1b1[1])
+
+
+def parse_workbook(cfg, mons, role_tab, values):
+    role = DEFAULT_ROLE
+    if role_tab:
+        head_rows, values = values[0], values[1:]
+        role = workbook_role(head_rows)
+    months = {m: parse_cv_rows(cfg, m, rows) for m, rows in zip(mons, values)}
+    return role, months
+
+
+def with_archive(cfg, months, titles):
+    """把刚读到的已结束月份封存进归档，再补上之前归档过的月份"""
+    cutoff = archive_cutoff()
+    for m, (cnt, det) in months.items():
+        if m < cutoff:
+            ARCHIVE.close(cfg["id"], m, det)
+    for m in ARCHIVE.closed_months(cfg["id"]):
+        if m in titles and m not in months:
+            months[m] = ARCHIVE.load(cfg["id"], m)
+    return dict(sorted(months.items()))
+
+
+def load_workbook(client, cfg):
+    """一本顾问表格 = 1次元数据（命中缓存时为0） + 1次 batchGet（Credentials!A1:B1 + 所有 YYYYMM 标签页）
+    月份页的解析结果在本进程内共用（shared_cv_tabs）；和 Supervisor.py 共用 PAYLOAD_DIR 时，那边读过当前版本也不再请求。
+    请求失败时抛异常，避免把失败结果当成缓存"""
+    tabs = get_tabs(client, cfg["id"])
+    mons, role_tab, ranges = workbook_ranges(list(tabs), ARCHIVE.closed_months(cfg["id"]))
+    role_ranges = ranges[:1] if role_tab else []
+    # 磁盘缓存里已有当前版本的区域不再请求；batchGet 本来就只要 1 次，只有 WORKBOOK_INGEST = "export" 时才整本导出
+    def cached(rngs):
+        # 只有 A1:B1 落盘；月份页的磁盘缓存是 shared_cv_tabs 存的解析用副本
+        return cached_workbook_values(client, cfg["id"], rngs, lambda missing: safe_google_api_call(
+            batch_get_values, client, cfg["id"], missing), safe_google_api_call, persist=role_ranges)
+
+    def read(missing):
+        if STREAM_ROWS:
+            # 分段读取：月份页一段一段读，解析用副本只留下有用的行
+            return [(chain.from_iterable(stream_tab(client, cfg["id"], m, safe_google_api_call)), True)
+                    for m in missing]
+        # A1:B1 跟缺的月份页一起读（之后读 role 直接命中磁盘缓存）
+        values = cached(role_ranges + [range_name(m) for m in missing])
+        if values is None:
+            raise RuntimeError(f"读取 {cfg['name']} 数据失败")
+        return [(rows, True) for rows in values[len(role_ranges):]]
+
+    keyword = cfg.get("keyword", "Name")
+    cvs = shared_cv_tabs(client, cfg["id"], mons, keyword, read, lambda rows: cv_rows(rows, keyword),
+                         lambda rows: CvTab(rows, keyword))
+    values = cached(role_ranges) if role_ranges else [[]]
+    if values is None:
+        raise RuntimeError(f"读取 {cfg['name']} 数据失败")
+    role = workbook_role(values[0])
+    months = {m: cv.counts(cfg["name"], m) for m, cv in zip(mons, cvs)}
+    return role, with_archive(cfg, months, tabs)
+
+
+async def load_workbook_async(ac, cfg):
+    """load_workbook 的异步版本（SHEETS_BACKEND = "async"）：1次元数据 + 1次 batchGet；失败时抛异常"""
+    sheet = await ac.open_by_key(cfg["id"])
+    titles = [w.title for w in await sheet.worksheets()]
+    mons, role_tab, ranges = workbook_ranges(titles, ARCHIVE.closed_months(cfg["id"]))
+    values = await sheet.values_batch_get(ranges)
+    role, months = parse_workbook(cfg, mons, role_tab, values)
+    return role, with_archive(cfg, months, titles)
+
+
+def fetch_workbook(client, cfg):
+    """返回 ((role, is_lead, title), {month: (count, details)})；表格没变动时直接复用上次结果。
+    失败时抛异常，由 run_with_deadline 换成上一次成功的结果"""
+    if SHEETS_BACKEND == "async" and not OFFLINE_PARSE:  # 离线时走带磁盘缓存的同步路径
+        return CHANGES.reuse(cfg["id"], "workbook", lambda: run_async(load_workbook_async, client.http_client.auth, cfg))
+    return CHANGES.reuse(cfg["id"], "workbook", lambda: load_workbook(client, cfg))
+
+
+def locate_financial_columns(rows):
+    """表头行 + parse_financial_rows 用到的列；表头以下出现 POSITION / PLACED 的列也一起读（结束标记）。
+    第 4 项：表头以下还没有结束标记时台账只在底部追加，可以增量读取；
+    第 5 项：老的行里也会被填写 / 修改的列（付款日期、提成比例），增量读取时整列核对；
+    第 6 项：typed 读取时也按显示的文本读的列（提成比例，口径见 ProjectedReader）"""
+    for h, r in enumerate(rows):
+        rl = [str(x).strip().lower() for x in r]
+        if any("linkeazi" in c for c in rl) and any("onboarding" in c for c in rl):
+            date_cols = {i for i, c in enumerate(rl)
+                         if ("onboarding" in c and "date" in c) or ("payment" in c and "onboard" not in c)}
+            cols = date_cols | {i for i, c in enumerate(rl)
+                                if ("linkeazi" in c and "consultant" in c) or ("candidate" in c and "salary" in c)
+                                or "percentage" in c or "pct" in c or c == "%"}
+            pct = {i for i, c in enumerate(rl) if "percentage" in c or "pct" in c or c == "%"}
+            watch = pct | {i for i, c in enumerate(rl) if "payment" in c and "onboard" not in c}
+            ended = False
+            for row in rows[h + 1:]:
+                cols |= {i for i, c in enumerate(row) if "POSITION" in str(c).upper() or "PLACED" in str(c).upper()}
+                ru = " ".join(str(x).strip() for x in row).upper()
+                ended = ended or ("POSITION" in ru and "PLACED" not in ru)
+            return h, cols, date_cols, not ended, watch, pct
+    return None
+
+
+def sales_tab(client):
+    tabs = get_tabs(client, SALES_SHEET_ID)
+    if not tabs:
+        return None
+    return SALES_TAB_NAME if SALES_TAB_NAME in tabs else next(iter(tabs))
+
+
+def sales_reader(title):
+    # 只按列读取 parse_financial_rows 用到的几列，表头变化时自动整页重读；typed 模式下日期 / 数字按原始值读取
+    return projected_reader(SALES_SHEET_ID, title, locate_financial_columns, typed=SALES_INGEST == "typed")
+
+
+def read_financial_df(client, year, s, e):
+    """销售台账只在底部追加：之前解析过的结果留着，只读新增的行解析后接上去。返回 (DataFrame, 拒收行)。
+    STREAM_ROWS > 0 时改成分段读取整页、边读边解析（不做增量读取）"""
+    title = sales_tab(client)
+    if title is None:
+        return pd.DataFrame(), pd.DataFrame(columns=REJECT_COLUMNS)
+    if STREAM_ROWS:
+        return parse_financial_chunks(stream_tab(client, SALES_SHEET_ID, title, safe_google_api_call,
+                                                 typed=SALES_INGEST == "typed", locate=locate_financial_columns),
+                                      year, s, e)
+    reader = sales_reader(title)
+    ledger = append_only_ledger(("financial", reader.tab, year, s, e), reader)
+    parsed = ledger.refresh(client, safe_google_api_call, lambda rows: parse_financial_rows(rows, year, s, e),
+                            append_parsed)
+    if parsed is None:
+        raise RuntimeError("读取销售表失败")
+    return parsed
 
 
 def fetch_financial_df(client, year, s, e):
-    try:
-        sheet = safe_google_api_call(client.open_by_key, SALES_SHEET_ID)
-        if not sheet:
-            return pd.DataFrame()
-        try:
-            ws = safe_google_api_call(sheet.worksheet, SALES_TAB_NAME)
-        except:
-            ws = safe_google_api_call(sheet.get_worksheet, 0)
-        rows = safe_google_api_call(ws.get_all_values)
-        if not rows:
-            return pd.DataFrame()
-        cc, co, cp, cs, cpt = -1, -1, -1, -1, -1
-        found = False
-        rec = []
-        for r in rows:
-            if not any(c.strip() for c in r):
-                continue
-            rl = [str(x).strip().lower() for x in r]
-            if not found:
-                if any("linkeazi" in c for c in rl) and any("onboarding" in c for c in rl):
-                    for i, c in enumerate(rl):
-                        if "linkeazi" in c and "consultant" in c: cc = i
-                        if "onboarding" in c and "date" in c: co = i
-                        if "candidate" in c and "salary" in c: cs = i
-                        if "payment" in c and "onboard" not in c: cp = i
-                        if "percentage" in c or "pct" in c or c == "%": cpt = i
-                    found = True
-                    continue
-            else:
-                ru = " ".join(rl).upper()
-                if "POSITION" in ru and "PLACED" not in ru:
-                    break
-                if len(r) <= max(cc, co, cs):
-                    continue
-                name = r[cc].strip()
-                if not name:
-                    continue
-                od_str = r[co].strip()
-                od = None
-                for f in ["%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%m/%d/%Y", "%d-%b-%y"]:
-                    try:
-                        od = datetime.strptime(od_str, f)
-                        break
-                    except:
-                        pass
-                if not od:
-                    continue
-                if not (od.year == year and s <= od.month <= e):
-                    continue
-                match = "Unknown"
-                n_norm = normalize_text(name)
-                for t in TEAM_CONFIG_TEMPLATE:
-                    t_norm = normalize_text(t["name"])
-                    if t_norm in n_norm or n_norm in t_norm:
-                        match = t["name"]
-                        break
-                if match == "Unknown":
-                    continue
-                sal_raw = str(r[cs]).replace(',', '').replace('$', '').replace('MXN', '').strip()
-                try:
-                    sal = float(sal_raw)
-                except:
-                    sal = 0
-                pct = 1.0
-                if cpt != -1 and len(r) > cpt:
-                    ps = str(r[cpt]).replace('%', '').strip()
-                    try:
-                        pf = float(ps)
-                        pct = pf / 100 if pf > 1 else pf
-                    except:
-                        pct = 1.0
-                factor = 1.0 if sal < 20000 else 1.5
-                gp = sal * factor * pct
-                pay_str = r[cp].strip() if (cp != -1 and len(r) > cp) else ""
-                stat = "Paid" if len(pay_str) > 5 else "Pending"
-                rec.append({
-                    "Consultant": match,
-                    "GP": gp,
-                    "Candidate Salary": sal,
-                    "Percentage": pct,
-                    "Onboard Date": od,
-                    "Payment Date": pay_str,
-                    "Status": stat
-                })
-        return pd.DataFrame(rec)
-    except:
-        return pd.DataFrame()
+    return CHANGES.reuse(SALES_SHEET_ID, ("financial", year, s, e), lambda: read_financial_df(client, year, s, e))
+
+
+def financial_header(r):
+    """销售表的表头行 -> parse_ledger 用的列号；不是表头时 None"""
+    rl = [str(x).strip().lower() for x in r]
+    if not (any("linkeazi" in c for c in rl) and any("onboarding" in c for c in rl)):
+        return None
+    cols = {"consultant": -1, "onboard": -1, "salary": -1, "pct": -1, "payment": -1}
+    for i, c in enumerate(rl):
+        if "linkeazi" in c and "consultant" in c: cols["consultant"] = i
+        if "onboarding" in c and "date" in c: cols["onboard"] = i
+        if "candidate" in c and "salary" in c: cols["salary"] = i
+        if "payment" in c and "onboard" not in c: cols["payment"] = i
+        if "percentage" in c or "pct" in c or c == "%": cols["pct"] = i
+    return cols
+
+
+def parse_financial_rows(rows, year, s, e):
+    """销售表 -> (year 年 s~e 月入职的 DataFrame, 没解析进来的行)"""
+    return parse_financial_chunks([rows], year, s, e)
+
+
+def parse_financial_chunks(chunks, year, s, e):
+    """按段给出的销售表（可以是 stream_tab 的生成器）整列解析，见 sheets_parse.parse_ledger_chunks"""
+    def in_period(od):
+        months = od.astype("datetime64[M]").astype(np.int64)
+        return (months // 12 + 1970 == year) & (months % 12 + 1 >= s) & (months % 12 + 1 <= e)
+
+    led, rejects = parse_ledger_chunks(chunks, financial_header, ("consultant", "onboard", "salary"),
+                                       FINANCIAL_DATE_FORMATS, (",", "$", "MXN"), CONSULTANTS.resolve, keep=in_period)
+    if led is None or not len(led["consultant"]):
+        return pd.DataFrame(), rejects
+    return pd.DataFrame({
+        "Consultant": led["consultant"],
+        "GP": led["gp"],
+        "Candidate Salary": led["salary"],
+        "Percentage": led["pct"],
+        "Onboard Date": led["onboard"],
+        "Payment Date": led["pay_text"],
+        "Status": np.where(led["paid"], "Paid", "Pending").astype(object)
+    }), rejects
 
 
 # ==========================================
@@ -606,6 +661,72 @@ def render_bar(cur, goal, cls, lbl, boss=False):
     """, unsafe_allow_html=True)
 
 
+def game_sources(client, year, s_m, e_m):
+    """每个数据源一个任务，key = (spreadsheet ID, 数据集)；CV、财务、佣金全部同时读取（两种 SHEETS_BACKEND 都一样）"""
+    tasks = {(t["id"], "workbook"): (lambda t=t: fetch_workbook(client, t)) for t in TEAM_CONFIG_TEMPLATE}
+    tasks[(SALES_SHEET_ID, "financial")] = lambda: fetch_financial_df(client, year, s_m, e_m)
+    tasks[(COMMISSION_SUMMARY_ID, "commission")] = lambda: load_commission_index(client)
+    return tasks
+
+
+def source_label(key):
+    names = {t["id"]: t["name"] for t in TEAM_CONFIG_TEMPLATE}
+    names.update({SALES_SHEET_ID: "SALES", COMMISSION_SUMMARY_ID: "COMMISSION"})
+    return names.get(key[0], key[0])
+
+
+def load_game_data(client):
+    """一次完整读取（后台刷新器和 PRESS START 共用），总耗时不超过 REFRESH_DEADLINE；
+    超时或失败的数据源用上一次成功的结果，并记在 stale 里给页面提示"""
+    _, _, s_m, e_m, year = get_quarter_info()
+    # 先问一次 Drive 哪些表格变了，没变的直接用上次的解析结果
+    CHANGES.poll(client, [t["id"] for t in TEAM_CONFIG_TEMPLATE] + [SALES_SHEET_ID, COMMISSION_SUMMARY_ID])
+    results, stale = run_with_deadline(game_sources(client, year, s_m, e_m))
+    books = [results[(t["id"], "workbook")] or (DEFAULT_ROLE, {}) for t in TEAM_CONFIG_TEMPLATE]
+    df_sales, sales_rejects = results[(SALES_SHEET_ID, "financial")] or (pd.DataFrame(), pd.DataFrame())
+    return {"books": books, "df_sales": df_sales, "sales_rejects": sales_rejects,
+            "commission": results[(COMMISSION_SUMMARY_ID, "commission")],
+            "stale": {source_label(k): as_of for k, as_of in stale.items()},
+            "last_updated": datetime.now().strftime("%H:%M:%S")}
+
+
+def render_limiter_metrics():
+    m = LIMITER.snapshot()
+    with st.sidebar:
+        st.markdown("#### ⏱️ API LIMITER")
+        st.metric("RATE (req/s)", m["rate"])
+        st.metric("CALLS", m["calls"])
+        st.metric("429s", m["throttled"])
+        st.metric("WAITED (s)", m["waited_s"])
+        st.metric("SHARED FETCHES", FLIGHTS.shared)
+        st.metric("HEDGED (WON)", f"{HEDGES.hedged} ({HEDGES.wins})")
+        for endpoint, q in LATENCY.snapshot().items():
+            st.caption(f"{endpoint}: p50 {q['p50']}s · p95 {q['p95']}s · p99 {q['p99']}s (n={q['n']})")
+        s = background_refresher("game").status()
+        if s["last_ok"]:
+            st.caption(f"🕒 DATA AS OF {s['last_ok']:%H:%M:%S}")
+        if s["last_error"]:
+            st.caption(f"⚠️ LAST REFRESH FAILED: {s['last_error']}")
+        open_ids = BREAKERS.open_ids()
+        if open_ids:
+            st.caption("🔌 PAUSED (TOO MANY ERRORS): " + ", ".join(source_label((sid,)) for sid in open_ids))
+
+
+def render_archive_controls():
+    """手动解封某个已归档月份（比如有人补录了历史数据）"""
+    with st.sidebar.expander("🗄️ ARCHIVE"):
+        name = st.selectbox("PLAYER", [t["name"] for t in TEAM_CONFIG_TEMPLATE], key="archive_player")
+        cfg = next(t for t in TEAM_CONFIG_TEMPLATE if t["name"] == name)
+        closed = ARCHIVE.closed_months(cfg["id"])
+        st.caption(f"{len(closed)} CLOSED MONTHS")
+        if closed:
+            month = st.selectbox("MONTH", closed[::-1], key="archive_month")
+            if st.button("RE-OPEN", key="archive_reopen"):
+                ARCHIVE.reopen(cfg["id"], month)
+                CHANGES.mark_changed([cfg["id"]])
+                st.success(f"{month} RE-OPENED")
+
+
 def render_card(conf, qcv, gp_actual, gp_target, comm, level, idx):
     """渲染个人卡片（恢复GP进度条、LEVEL标签）"""
     name = conf["name"]
@@ -663,19 +784,43 @@ def main():
     go = st.button("🚩 PRESS START")
     st.markdown('</div>', unsafe_allow_html=True)
 
-    if not go:
-        return
-
+    render_archive_controls()
     client = connect_to_google()
     if not client:
         return
+    # 进程级后台刷新：打开页面就开始准备数据，PRESS START 时直接读最近一次结果
+    feed = background_refresher("game")
+    data = feed.read(lambda: load_game_data(client))
+    if not go:
+        return
 
     team = []
+    cv_by_person = {}
     status = st.empty()
     status.info("🔐 LOADING TEAM...")
-    for t in TEAM_CONFIG_TEMPLATE:
-        role, lead, title = fetch_role(client, t["id"])
-        team.append({**t, "role": role, "is_team_lead": lead, "title": title})
+    with st.spinner("📥 读取所有简历数据..."):
+        if data is None:
+            try:
+                data = feed.wait()
+            except TimeoutError:
+                pass
+        if data is None:
+            status.empty()
+            st.error(f"⏳ 数据还没准备好，请稍后再按 PRESS START（{feed.status()['last_error'] or '读取中'}）")
+            return
+        if data["stale"]:
+            st.warning("⚠️ STALE DATA: " + ", ".join(
+                f"{k} ({v:%H:%M} 的快照)" if v else f"{k} (暂无数据)" for k, v in data["stale"].items()))
+        if not data["sales_rejects"].empty:
+            st.caption(f"⚠️ 销售表有 {len(data['sales_rejects'])} 行没有算进来：" + ", ".join(
+                f"{reason} × {n}" for reason, n in data["sales_rejects"]["Reason"].value_counts().items()))
+        ambiguous = dict(CONSULTANTS.ambiguous)  # 后台刷新线程可能正在往里写
+        if ambiguous:
+            st.caption("⚠️ 销售表里这些名字能对上不止一个人（用的是第一个）：" + "; ".join(
+                f"{raw} → {' / '.join(names)}" for raw, names in ambiguous.items()))
+        for t, ((role, lead, title), months) in zip(TEAM_CONFIG_TEMPLATE, data["books"]):
+            team.append({**t, "role": role, "is_team_lead": lead, "title": title})
+            cv_by_person[t["name"]] = months
     status.empty()
 
     # 全局明细（修复Count列）
@@ -691,25 +836,22 @@ def main():
     for p in team:
         qtr_cv[p["name"]] = 0
 
-    with st.spinner("📥 读取所有简历数据..."):
-        for p in team:
-            all_mons = get_all_month_tabs(client, p)
-            p_month = 0
-            p_qtr = 0
-            for m in all_mons:
-                cnt, det = fetch_cv_one_month(client, p, m)
-                all_details.extend(det)
-                # 当月
-                if m == curr_mm:
-                    p_month = cnt
-                # 本季度
-                if m in qtr_tabs:
-                    p_qtr += cnt
-            monthly_cv[p["name"]] = p_month
-            qtr_cv[p["name"]] = p_qtr
+    for p in team:
+        p_month = 0
+        p_qtr = 0
+        for m, (cnt, det) in cv_by_person[p["name"]].items():
+            all_details.extend(det)
+            # 当月
+            if m == curr_mm:
+                p_month = cnt
+            # 本季度
+            if m in qtr_tabs:
+                p_qtr += cnt
+        monthly_cv[p["name"]] = p_month
+        qtr_cv[p["name"]] = p_qtr
 
     # 财务数据（用于计算GP TARGET和LEVEL）
-    df_sales = fetch_financial_df(client, year, s_m, e_m)
+    df_sales = data["df_sales"]
 
     # 月度团队目标
     mt = sum(monthly_cv.values())
@@ -766,6 +908,8 @@ def main():
     r2 = st.columns(2)
     cols = r1 + r2
 
+    commission = data["commission"] or CommissionIndex([])
+
     for i, p in enumerate(team):
         name = p["name"]
         qcv = qtr_cv[name]
@@ -782,7 +926,7 @@ def main():
         level, _ = calculate_commission_tier(gp_actual, base_salary, is_lead)
 
         # 读取佣金（从指定Sheet）
-        comm = get_commission_from_sheet(client, name) if not is_intern else 0
+        comm = commission.get(name) if not is_intern else 0
 
         with cols[i]:
             render_card(p, qcv, gp_actual, gp_target, comm, level, i)
@@ -811,6 +955,8 @@ def main():
             agg.columns = ["CLIENT", "ROLE", "TOTAL CVs"]
             st.dataframe(agg, use_container_width=True, hide_index=True)
 
+    render_limiter_metrics()
+
 
 if __name__ == "__main__":
     main()
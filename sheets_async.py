@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+from urllib.parse import quote
+
+import aiohttp
+from google.auth.transport.requests import Request
+from gspread.cell import Cell
+from gspread.utils import a1_to_rowcol, absolute_range_name, fill_gaps, numericise_all, to_records
+
+from sheets_io import LIMITER, MAX_RETRIES, USER_AGENT, is_rate_limited_response
+
+# ==========================================
+# ⚡ 异步 Google Sheets v4 客户端（单个事件循环里同时挂几百个请求）
+# ==========================================
+# 指向本地的 Sheets 替身服务时改这个环境变量即可，例如 http://127.0.0.1:8080/v4/spreadsheets
+# （tests/test_sheets_async.py 里的 StandIn 就是一个 aiohttp 写的替身）
+SHEETS_API_ROOT = os.environ.get("SHEETS_API_ROOT", "https://sheets.googleapis.com/v4/spreadsheets")
+ASYNC_CONCURRENCY = 100  # 同时在途的请求上限
+ASYNC_TIMEOUT = 60
+
+
+class AsyncAPIError(Exception):
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+        try:
+            self.error = json.loads(body).get("error", {})
+        except ValueError:
+            self.error = {}
+        super().__init__(f"[{status}] {self.error.get('message', body[:200])}")
+
+
+def _retry_after(headers):
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncSheetsClient:
+    """用法：
+        async with AsyncSheetsClient(client.http_client.auth) as ac:
+            sheet = await ac.open_by_key(sheet_id)
+    credentials 为 None 时不带 Authorization 头（本地替身服务）"""
+
+    def __init__(self, credentials, root=SHEETS_API_ROOT, concurrency=ASYNC_CONCURRENCY):
+        self.credentials = credentials
+        self.root = root.rstrip("/")
+        self._sem = asyncio.Semaphore(concurrency)
+        self._token_lock = asyncio.Lock()
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=ASYNC_TIMEOUT),
+                                              headers={"User-Agent": USER_AGENT})
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def _headers(self):
+        if self.credentials is None:
+            return {}
+        async with self._token_lock:
+            if not self.credentials.valid:
+                # google-auth 的刷新是同步的，放到线程里做，不卡住事件循环
+                await asyncio.to_thread(self.credentials.refresh, Request())
+        return {"Authorization": f"Bearer {self.credentials.token}"}
+
+    async def request(self, method, path, params=None, body=None):
+        url = f"{self.root}/{path}"
+        for _ in range(MAX_RETRIES):
+            # 与同步路径共用同一个 AIMD 限速器
+            wait = LIMITER.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            async with self._sem:
+                async with self._session.request(method, url, params=params, json=body,
+                                                 headers=await self._headers()) as resp:
+                    text = await resp.text()
+                    if resp.status < 400:
+                        LIMITER.on_success()
+                        return json.loads(text) if text else {}
+                    err = AsyncAPIError(resp.status, text)
+                    if not is_rate_limited_response(resp.status, err.error):
+                        raise err
+                    LIMITER.on_throttle(_retry_after(resp.headers))
+        raise err
+
+    async def open_by_key(self, key):
+        meta = await self.request("GET", quote(key), params={"includeGridData": "false"})
+        return AsyncSpreadsheet(self, key, meta)
+
+
+class AsyncSpreadsheet:
+    def __init__(self, client, sheet_id, metadata):
+        self.client = client
+        self.id = sheet_id
+        self.title = metadata.get("properties", {}).get("title", "")
+        self._sheets = [s["properties"] for s in metadata.get("sheets", [])]
+
+    async def worksheets(self):
+        return [AsyncWorksheet(self, p) for p in self._sheets]
+
+    async def worksheet(self, title):
+        for p in self._sheets:
+            if p["title"] == title:
+                return AsyncWorksheet(self, p)
+        raise KeyError(title)
+
+    async def values_get(self, range_name, params=None):
+        return await self.client.request("GET", f"{quote(self.id)}/values/{quote(range_name, safe='')}", params=params)
+
+    async def values_batch_get(self, ranges, params=None):
+        """返回和 ranges 一一对应的（补齐成矩形的）二维列表"""
+        if not ranges:
+            return []
+        q = [("ranges", r) for r in ranges] + list((params or {}).items())
+        res = await self.client.request("GET", f"{quote(self.id)}/values:batchGet", params=q)
+        return [fill_gaps(vr["values"]) if vr.get("values") else [] for vr in res.get("valueRanges", [])]
+
+    async def batch_update(self, body):
+        return await self.client.request("POST", f"{quote(self.id)}:batchUpdate", body=body)
+
+    async def add_worksheet(self, title, rows, cols):
+        body = {"requests": [{"addSheet": {"properties": {
+            "title": title, "gridProperties": {"rowCount": int(rows), "columnCount": int(cols)}}}}]}
+        res = await self.batch_update(body)
+        props = res["replies"][0]["addSheet"]["properties"]
+        self._sheets.append(props)
+        return AsyncWorksheet(self, props)
+
+
+class AsyncWorksheet:
+    def __init__(self, spreadsheet, properties):
+        self.spreadsheet = spreadsheet
+        self._properties = properties
+
+    @property
+    def title(self):
+        return self._properties["title"]
+
+    @property
+    def id(self):
+        return self._properties["sheetId"]
+
+    def _range(self, cells=None):
+        return absolute_range_name(self.title, cells)
+
+    async def get_all_values(self):
+        res = await self.spreadsheet.values_get(self._range())
+        values = res.get("values", [])
+        return fill_gaps(values) if values else []
+
+    async def range(self, name):
+        res = await self.spreadsheet.values_get(self._range(name))
+        r0, c0 = a1_to_rowcol(name.split(":")[0])
+        r1, c1 = a1_to_rowcol(name.split(":")[-1])
+        values = fill_gaps(res.get("values") or [], rows=r1 - r0 + 1, cols=c1 - c0 + 1)
+        return [Cell(r0 + i, c0 + j, values[i][j]) for i in range(r1 - r0 + 1) for j in range(c1 - c0 + 1)]
+
+    async def acell(self, label):
+        return (await self.range(label))[0]
+
+    async def get_all_records(self, head=1):
+        values = await self.get_all_values()
+        if not values:
+            return []
+        keys = values[head - 1]
+        return to_records(keys, [numericise_all(row) for row in values[head:]])
+
+    async def update(self, range_name, values, value_input_option="RAW"):
+        return await self.spreadsheet.client.request(
+            "PUT", f"{quote(self.spreadsheet.id)}/values/{quote(self._range(range_name), safe='')}",
+            params={"valueInputOption": value_input_option},
+            body={"range": self._range(range_name), "majorDimension": "ROWS", "values": values})
+
+    async def clear(self):
+        return await self.spreadsheet.client.request(
+            "POST", f"{quote(self.spreadsheet.id)}/values/{quote(self._range(), safe='')}:clear")
+
+
+def run_async(coro_fn, credentials, *args):
+    """在新的事件循环里跑 coro_fn(ac, *args)，给同步的 Streamlit 脚本调用"""
+    async def main():
+        async with AsyncSheetsClient(credentials) as ac:
+            return await coro_fn(ac, *args)
+
+    return asyncio.run(main())
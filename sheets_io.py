@@ -0,0 +1,1356 @@
+import hashlib
+import io
+import json
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+from requests.adapters import HTTPAdapter
+
+import gspread
+import openpyxl
+import pandas as pd
+from google.auth.transport.requests import AuthorizedSession
+from google.oauth2 import service_account
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range, absolute_range_name, fill_gaps, rowcol_to_a1
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from sheets_store import PAYLOADS
+
+# ==========================================
+# 📡 Google Sheets 读取工具（head.py / Supervisor.py 共用）
+# ==========================================
+MONTH_TAB_RE = re.compile(r"\d{6}")
+METADATA_TTL = 600  # 秒；标签页结构很少变，10分钟内不再重复拉元数据
+MAX_RETRIES = 5
+API_CONCURRENCY = 6  # 整个进程同时在途的 Google API 请求上限（所有会话共享，防止打爆配额）
+FLIGHT_TIMEOUT = 120  # 秒；搭别人的请求时最多等多久
+REFRESH_INTERVAL = 300  # 秒；后台刷新间隔
+REFRESH_IDLE_STOP = 1800  # 秒；这么久没有页面来读数据，后台刷新就停下（下次有人打开再启动）
+REFRESH_DEADLINE = 45  # 秒；一次刷新的总预算，超时的数据源用上一次成功的结果
+BREAKER_FAILURES = 3  # 同一本表格连续失败几次后熔断
+BREAKER_COOLDOWN = 300  # 秒；熔断期间不再请求这本表格，到期后放一次试探请求
+
+# 对冲读取：只读请求超过该接口的 p95 耗时还没回来，就再发一个，谁先回来用谁
+HEDGE_ENDPOINTS = {"batch_get_values", "get_all_values", "values_get"}  # 清空即关闭对冲
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20  # 样本太少时不对冲
+HEDGE_MAX_RATIO = 0.1  # 额外请求最多占可对冲请求的 10%
+LATENCY_WINDOW = 200  # 每个接口保留最近多少次耗时
+PRESSURE_WINDOW = 60  # 秒；这段时间内被限流过就视为配额紧张，不对冲
+
+# typed 读取：数字和日期按原始值返回，日期是 1899-12-30 起的天数
+TYPED_RENDER = {"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "SERIAL_NUMBER"}
+SHEETS_EPOCH = "1899-12-30"
+MIN_DATE_SERIAL = 32874  # 1990-01-01；日期列里更小的数字不当日期（比如付款日期里写的 3），按原来的文本处理
+
+# 只追加的台账（Positions）：记住读到第几行 + 最后几行的指纹，之后只读新增的行
+TAIL_WINDOW = 5  # 指纹覆盖的末尾行数（同时也会重新读这几行用来核对）
+TAIL_FULL_EVERY = 20  # 连续增量读取这么多次后整表重读一次，兜底发现更早的行被改过
+PROJECT_FULL_EVERY = 20  # 按列读取这么多次后整页读一次重新定位（结束标记可能写在了之前没读的列里）
+SPARSE_MAX_RANGES = 100  # 一个标签页的标签行拆成太多段时不值得按行读取，直接整页读
+# 分段读取：>0 时大标签页（Positions、CV 月份页的整页读取）按这么多行一段读，边读边解析，
+# 内存里同时只有一段原始数据，和表格有多大无关；请求次数会变多。0 = 整页读取
+STREAM_ROWS = 0
+
+# AIMD 限速参数（请求/秒）：成功一次 +RATE_STEP，遇到真正的限流就 ×RATE_CUT
+RATE_START = 1.0
+RATE_MIN = 0.2
+RATE_MAX = 5.0
+RATE_STEP = 0.05
+RATE_CUT = 0.5
+BACKOFF_BASE = 1.0  # 没有 Retry-After 时的退避基数（秒），连续限流按 2^n 递增
+BACKOFF_MAX = 30.0
+
+DRIVE_API = "https://www.googleapis.com/drive/v3"
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+POOL_SIZE = 16  # keep-alive 连接池大小，要大于 API_CONCURRENCY + 扇出线程数
+USER_AGENT = "recruitment-dashboard (gzip)"  # Google API 要求 UA 里带 gzip 才会压缩响应
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# "values"：缺的区域一次 values:batchGet；"export"：整本导出 XLSX（也是 1 次请求，但走 Drive 的配额）
+WORKBOOK_INGEST = "values"
+EXPORT_VARIANT = "xlsx"  # 导出的内容是原始值（日期 YYYY-MM-DD），和 values 接口的缓存分开存
+# True：完全不联网，标签页列表和数据都用磁盘缓存里最近一次的内容（断网时重跑解析用）；缓存里没有的当作读取失败
+OFFLINE_PARSE = False
+METADATA_KEY = "#metadata"  # 磁盘缓存里元数据（标签页列表）的键，OFFLINE_PARSE 时用
+
+API_SLOTS = threading.BoundedSemaphore(API_CONCURRENCY)
+
+
+def fetch_metadata(client, sheet_id):
+    """一次请求拿到整本表格的元数据（标签页标题、sheetId、行列数）"""
+    return client.http_client.fetch_sheet_metadata(sheet_id)
+
+
+def month_tabs(titles):
+    return sorted(t for t in titles if MONTH_TAB_RE.fullmatch(t))
+
+
+def range_name(tab, cells=None):
+    return absolute_range_name(tab, cells)
+
+
+def batch_get_values(client, sheet_id, ranges, params=None):
+    """values:batchGet —— 一次请求读取多个区域，按请求顺序返回（补齐成矩形的）二维列表"""
+    if not ranges:
+        return []
+    res = client.http_client.values_batch_get(sheet_id, ranges, params=dict(params or {}))
+    out = []
+    for vr in res.get("valueRanges", []):
+        values = vr.get("values", [])
+        out.append(fill_gaps(values) if values else [])
+    return out
+
+
+# ==========================================
+# 🔑 进程级共享的已授权客户端：所有 rerun / 会话 / 线程共用同一个连接池和 token
+# ==========================================
+class SharedCredentials(service_account.Credentials):
+    """多个线程同时发现 token 快过期时只刷新一次"""
+    _refresh_lock = threading.Lock()
+
+    def refresh(self, request):
+        with self._refresh_lock:
+            if self.valid:  # 排队期间别的线程已经刷新过了
+                return
+            super().refresh(request)
+
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def shared_client(info):
+    """按服务账号复用 gspread 客户端。token 在过期前几分钟由后台线程提前刷新（google-auth 的非阻塞刷新），
+    请求不会卡在换 token 上；HTTP 连接 keep-alive 复用，响应走 gzip。"""
+    key = info.get("client_email")
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            creds = SharedCredentials.from_service_account_info(info, scopes=SCOPES)
+            creds.with_non_blocking_refresh()
+            session = AuthorizedSession(creds)
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip", "User-Agent": USER_AGENT})
+            client = gspread.Client(creds, session=session)
+            client.http_client.auth = creds  # 传入 session 时 gspread 不会设置 auth，异步后端要用
+            _CLIENTS[key] = client
+        return _CLIENTS[key]
+
+
+# ==========================================
+# ⏱️ 自适应限速（AIMD）：两个看板共用一个进程级限速器
+# ==========================================
+class RateLimiter:
+    def __init__(self, rate=RATE_START, min_rate=RATE_MIN, max_rate=RATE_MAX, step=RATE_STEP, cut=RATE_CUT):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self.cut = cut
+        self._lock = threading.Lock()
+        self._next_at = 0.0  # 下一个请求最早的发出时间（monotonic）
+        self._blocked_until = 0.0  # 限流后的冷却截止时间
+        self._streak = 0  # 连续限流次数
+        self._last_throttle = 0.0
+        self.calls = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def reserve(self):
+        """占一个发送时间点，返回需要等待的秒数（异步客户端用 asyncio.sleep 等）"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_at, self._blocked_until)
+            self._next_at = start + 1.0 / self.rate
+            wait = start - now
+            self.calls += 1
+            self.waited += wait
+        return wait
+
+    def acquire(self):
+        """按当前速率排队；只有在真的超速或处于冷却期时才会 sleep"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.step)
+            self._streak = 0
+
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.cut)
+            self.throttled += 1
+            if retry_after is None:
+                retry_after = min(BACKOFF_BASE * (2 ** self._streak), BACKOFF_MAX) + random.uniform(0, 0.5)
+            self._streak += 1
+            self._last_throttle = time.monotonic()
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+    def under_pressure(self):
+        """还在冷却期，或者最近 PRESSURE_WINDOW 秒内被限流过"""
+        with self._lock:
+            now = time.monotonic()
+            return self._blocked_until > now or (self.throttled and now - self._last_throttle < PRESSURE_WINDOW)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "rate": round(self.rate, 2),
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "waited_s": round(self.waited, 1),
+                "cooldown_s": round(max(0.0, self._blocked_until - time.monotonic()), 1),
+            }
+
+
+LIMITER = RateLimiter()
+
+
+def is_rate_limited(exc):
+    """只认真正的限流响应：HTTP 429 / RESOURCE_EXHAUSTED / Drive 的 rateLimitExceeded"""
+    if not isinstance(exc, APIError):
+        return False
+    return is_rate_limited_response(exc.code, exc.error or {})
+
+
+def is_rate_limited_response(status, error):
+    """HTTP 状态码 + Google 的 error 对象 -> 是不是限流（sheets_async 也用这个，两个后端口径一致）"""
+    if status == 429 or error.get("status") == "RESOURCE_EXHAUSTED":
+        return True
+    reasons = {e.get("reason") for e in error.get("errors", []) if isinstance(e, dict)}
+    return status == 403 and bool(reasons & {"rateLimitExceeded", "userRateLimitExceeded"})
+
+
+def retry_after(exc):
+    """解析 Retry-After（秒数或 HTTP 日期），没有则返回 None"""
+    resp = getattr(exc, "response", None)
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+_local = threading.local()
+
+
+def deadline_remaining():
+    """当前线程所在刷新还剩多少秒；不在 run_with_deadline 里时为 None（不限时）"""
+    end = getattr(_local, "deadline", None)
+    return None if end is None else end - time.monotonic()
+
+
+def limited_call(func, *args, **kwargs):
+    """经过限速器 + 并发槽发出一次请求；限流异常会先反馈给限速器再抛出，由调用方决定是否重试。
+    在有时间预算的刷新里，排队时间超过剩余预算就直接放弃，不再傻等退避。
+    HEDGE_ENDPOINTS 里的只读请求会按需对冲（见 hedged_call）"""
+    endpoint = getattr(func, "__name__", "call")
+    if endpoint in HEDGE_ENDPOINTS:
+        return hedged_call(endpoint, func, args, kwargs)
+    return _attempt(endpoint, func, args, kwargs)
+
+
+def _attempt(endpoint, func, args, kwargs):
+    remaining = deadline_remaining()
+    if remaining is None:
+        LIMITER.acquire()
+    else:
+        wait_s = LIMITER.reserve()
+        if wait_s > remaining:
+            raise DeadlineExceeded(f"需要排队 {wait_s:.1f}s，预算只剩 {max(remaining, 0):.1f}s")
+        if wait_s > 0:
+            time.sleep(wait_s)
+    try:
+        with API_SLOTS:
+            started = time.monotonic()
+            result = func(*args, **kwargs)
+            LATENCY.record(endpoint, time.monotonic() - started)
+    except Exception as e:
+        if is_rate_limited(e):
+            LIMITER.on_throttle(retry_after(e))
+        raise
+    LIMITER.on_success()
+    return result
+
+
+# ==========================================
+# 🐢 尾延迟：按接口统计耗时分位数，慢请求发一个备份请求
+# ==========================================
+class LatencyTracker:
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}  # endpoint -> deque[秒]
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, endpoint, q, min_samples=HEDGE_MIN_SAMPLES):
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self):
+        """{endpoint: {"n", "p50", "p95", "p99"}}（秒）"""
+        with self._lock:
+            counts = {e: len(v) for e, v in self._samples.items()}
+        return {e: {"n": n, **{f"p{int(q * 100)}": round(self.percentile(e, q, 1), 2) for q in (0.5, 0.95, 0.99)}}
+                for e, n in counts.items()}
+
+
+class HedgeBudget:
+    """额外请求不超过可对冲请求数的 max_ratio，限速器有压力时完全不对冲"""
+
+    def __init__(self, max_ratio=HEDGE_MAX_RATIO):
+        self.max_ratio = max_ratio
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.wins = 0  # 备份请求先回来的次数
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def take(self):
+        if LIMITER.under_pressure():
+            return False
+        with self._lock:
+            if self.hedged + 1 > self.max_ratio * self.calls:
+                return False
+            self.hedged += 1
+            return True
+
+    def won(self):
+        with self._lock:
+            self.wins += 1
+
+
+LATENCY = LatencyTracker()
+HEDGES = HedgeBudget()
+
+
+def hedged_call(endpoint, func, args, kwargs):
+    """先发一次；超过该接口 p95 还没回来且预算允许，就再发一次，返回先成功的那个。两次都失败才抛异常"""
+    HEDGES.count_call()
+    threshold = LATENCY.percentile(endpoint, HEDGE_PERCENTILE)
+    if threshold is None:
+        return _attempt(endpoint, func, args, kwargs)
+    results = queue.Queue()
+    deadline = getattr(_local, "deadline", None)
+
+    def run(tag):
+        _local.deadline = deadline
+        try:
+            results.put((tag, True, _attempt(endpoint, func, args, kwargs)))
+        except Exception as e:
+            results.put((tag, False, e))
+
+    threading.Thread(target=run, args=("primary",), daemon=True).start()
+    in_flight = 1
+    try:
+        first = results.get(timeout=threshold)
+    except queue.Empty:
+        if HEDGES.take():
+            threading.Thread(target=run, args=("hedge",), daemon=True).start()
+            in_flight += 1
+        first = results.get()
+    tag, ok, value = first
+    if not ok and in_flight > 1:
+        tag, ok, value = results.get()
+    if not ok:
+        raise value
+    if tag == "hedge":
+        HEDGES.won()
+    return value
+
+
+# ==========================================
+# 🗂️ 元数据缓存：按 spreadsheet ID 保存标签页标题 / sheetId / 行列数
+# ==========================================
+class MetadataCache:
+    def __init__(self, ttl=METADATA_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = {}  # sheet_id -> (fetched_at, {title: properties})
+
+    def get(self, client, sheet_id, refresh=False):
+        """返回 {标题: properties}（保持表格里的标签页顺序）；命中且未过期时不发请求。
+        每次拉到的元数据也存一份到磁盘缓存，OFFLINE_PARSE 时只用那一份"""
+        with self._lock:
+            hit = self._data.get(sheet_id)
+        if hit and not refresh and time.time() - hit[0] < self.ttl:
+            return hit[1]
+        if OFFLINE_PARSE:
+            tabs = PAYLOADS.latest(sheet_id, METADATA_KEY)
+            if tabs is None:
+                raise RuntimeError(f"离线模式下磁盘缓存里没有 {sheet_id} 的元数据")
+        else:
+            # 只有真正发请求时才占限速器 / 并发槽（命中缓存不算一次调用）
+            meta = _limited_metadata(client, sheet_id)
+            tabs = {s["properties"]["title"]: s["properties"] for s in meta.get("sheets", [])}
+            PAYLOADS.put(sheet_id, METADATA_KEY, "latest", tabs)
+        with self._lock:
+            self._data[sheet_id] = (time.time(), tabs)
+        return tabs
+
+    def invalidate(self, sheet_id=None):
+        """sheet_id=None 时清空全部"""
+        with self._lock:
+            if sheet_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(sheet_id, None)
+
+
+METADATA_CACHE = MetadataCache()
+
+
+def _limited_metadata(client, sheet_id):
+    for _ in range(MAX_RETRIES):
+        try:
+            return limited_call(fetch_metadata, client, sheet_id)
+        except Exception as e:
+            if not is_rate_limited(e):
+                raise
+    raise RuntimeError("读取表格元数据失败（重试次数用尽）")
+
+
+def get_tabs(client, sheet_id):
+    return METADATA_CACHE.get(client, sheet_id)
+
+
+def grid_size(props):
+    grid = props.get("gridProperties", {})
+    return grid.get("rowCount", 0), grid.get("columnCount", 0)
+
+
+def _worksheet(client, sheet_id, props):
+    # 直接用缓存里的 properties 构造 Worksheet，不再走 open_by_key / sheet.worksheet 的元数据请求
+    return gspread.Worksheet(None, props, spreadsheet_id=sheet_id, client=client.http_client)
+
+
+def open_worksheet(client, sheet_id, title):
+    """按标题取标签页；缓存里没有时（可能是新建的月份页）强制刷新一次元数据"""
+    tabs = get_tabs(client, sheet_id)
+    if title not in tabs:
+        tabs = METADATA_CACHE.get(client, sheet_id, refresh=True)
+    if title not in tabs:
+        raise WorksheetNotFound(title)
+    return _worksheet(client, sheet_id, tabs[title])
+
+
+# ==========================================
+# 🛬 合并相同请求：多个会话同时读同一份数据时只发一次请求
+# ==========================================
+class SingleFlight:
+    """同一个 key 同一时间只有一个调用者（leader）真正执行 fn，其它调用者等它的结果。
+    leader 失败时所有等待者拿到同一个异常；每个等待者有自己的超时，超时抛 TimeoutError，不影响 leader。"""
+
+    def __init__(self, timeout=FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future
+        self.shared = 0  # 被合并掉的调用次数
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return fut.result(timeout=self.timeout if timeout is None else timeout)
+        try:
+            fut.set_result(fn())
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return fut.result()
+
+
+FLIGHTS = SingleFlight()
+
+
+# ==========================================
+# 🔎 变更检测：Drive changes feed 一次轮询所有表格，没变的直接复用上次解析结果
+# ==========================================
+class ChangeTracker:
+    """每个 spreadsheet 一个"代数"（generation）。轮询到 Drive 变更就 +1；
+    缓存的解析结果记录自己对应的代数，代数没变就说明表格没改过，可以直接复用。
+    两个看板 / 多个会话共用，谁轮询都不会让别人的缓存误判为最新。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()  # 同一时间只有一个会话在读 changes feed
+        self._token = None  # changes feed 的 pageToken
+        self._gen = {}  # sheet_id -> generation
+        self._revision = {}  # sheet_id -> Drive version（变更后失效，按需重新查询）
+        self._results = {}  # (sheet_id, key) -> (generation, value)
+
+    def mark_changed(self, sheet_ids):
+        """让这些表格的缓存结果失效（轮询到变更、或手动要求重读时调用）"""
+        with self._lock:
+            for sid in sheet_ids:
+                self._gen[sid] = self._gen.get(sid, 0) + 1
+                self._revision.pop(sid, None)
+        for sid in sheet_ids:
+            METADATA_CACHE.invalidate(sid)
+
+    def poll(self, client, sheet_ids):
+        """通常只花 1 次请求（changes.list）；第一次或出错时把所有表格都当作已变动。OFFLINE_PARSE 时不轮询"""
+        if OFFLINE_PARSE:
+            return set()
+        sheet_ids = set(sheet_ids)
+        with self._poll_lock:
+            return self._poll(client, sheet_ids)
+
+    def _poll(self, client, sheet_ids):
+        try:
+            if self._token is None:
+                res = limited_call(client.http_client.request, "get", f"{DRIVE_API}/changes/startPageToken",
+                                   params={"supportsAllDrives": True}).json()
+                self._token = res["startPageToken"]
+                self.mark_changed(sheet_ids)
+                return sheet_ids
+            changed, token = set(), self._token
+            while token:
+                res = limited_call(client.http_client.request, "get", f"{DRIVE_API}/changes", params={
+                    "pageToken": token, "pageSize": 1000, "fields": "nextPageToken,newStartPageToken,changes(fileId)",
+                    "includeItemsFromAllDrives": True, "supportsAllDrives": True}).json()
+                changed.update(c.get("fileId") for c in res.get("changes", []))
+                token = res.get("nextPageToken")
+                if res.get("newStartPageToken"):
+                    self._token = res["newStartPageToken"]
+            changed &= sheet_ids
+        except Exception:
+            changed = sheet_ids
+        self.mark_changed(changed)
+        return changed
+
+    def revision(self, client, sheet_id):
+        """Drive 文件的 version（每次修改都会变），进程重启后也稳定，用作磁盘缓存的版本号"""
+        with self._lock:
+            rev = self._revision.get(sheet_id)
+        if rev is None:
+            res = FLIGHTS.do(("version", sheet_id), lambda: limited_call(
+                client.http_client.request, "get", f"{DRIVE_API}/files/{sheet_id}",
+                params={"fields": "version", "supportsAllDrives": True}).json())
+            rev = str(res["version"])
+            with self._lock:
+                self._revision[sheet_id] = rev
+        return rev
+
+    def generation(self, sheet_id):
+        with self._lock:
+            return self._gen.get(sheet_id, 0)
+
+    def reuse(self, sheet_id, key, fetch):
+        """表格没变动就返回上次 fetch() 的结果；fetch() 抛异常时不缓存，异常照常抛出。
+        其它会话正在为同一代数做同一个 fetch 时直接等它的结果"""
+        gen = self.generation(sheet_id)
+        with self._lock:
+            hit = self._results.get((sheet_id, key))
+        if hit and hit[0] == gen and self._token is not None:
+            return hit[1]
+        value = FLIGHTS.do(("reuse", sheet_id, key, gen), fetch)
+        with self._lock:
+            self._results[(sheet_id, key)] = (gen, value)
+        return value
+
+
+CHANGES = ChangeTracker()
+
+
+def cached_values(client, sheet_id, key, fetch, variant=None):
+    """磁盘缓存挡在 get_all_values 前面：同一 Drive version 下直接读本地；
+    OFFLINE_PARSE 时直接用最近一次缓存的内容，保证解析可以离线重跑。
+    key 用 range_name(标题) 或完整的 A1 区域，和 cached_batch_values 共用一套键"""
+    rows = cached_batch_values(client, sheet_id, [key], lambda missing: _as_batch(fetch()), variant)
+    return rows[0] if rows is not None else None
+
+
+def _as_batch(rows):
+    return None if rows is None else [rows]
+
+
+def payload_revision(client, sheet_id):
+    """磁盘缓存用的版本号；OFFLINE_PARSE 时为 None（用最近一次缓存的内容）。
+    查询失败（限流、网络错误）照常抛出，由 run_with_deadline 标成过期数据，不拿旧内容当成当前版本缓存起来"""
+    if OFFLINE_PARSE:
+        return None
+    return CHANGES.revision(client, sheet_id)
+
+
+def cached_batch_values(client, sheet_id, ranges, fetch, variant=None, persist=None):
+    """fetch(缺失的 ranges) -> 对应的二维列表（失败返回 None）；已缓存的区域不再请求。
+    variant 区分同一区域的不同取值方式（比如 "typed" = UNFORMATTED_VALUE），各自单独缓存。
+    persist：读到后要落盘的区域，默认全部（CV 月份页由 shared_cv_tabs 只存解析用副本，整页不再另存一份）。
+    OFFLINE_PARSE 时不调用 fetch，缓存里缺区域就返回 None（和读取失败一样）"""
+    rev = payload_revision(client, sheet_id)
+    keys = {r: f"{r}#{variant}" if variant else r for r in ranges}
+    out = {}
+    for r in ranges:
+        rows = PAYLOADS.get(sheet_id, keys[r], rev) if rev else PAYLOADS.latest(sheet_id, keys[r])
+        if rows is not None:
+            out[r] = rows
+    missing = [r for r in ranges if r not in out]
+    if missing and OFFLINE_PARSE:
+        return None
+    if missing:
+        fetched = FLIGHTS.do(("values", sheet_id, rev, variant, tuple(missing)), lambda: fetch(missing))
+        if fetched is None:
+            return None
+        out.update(zip(missing, fetched))
+        store = {keys[r]: rows for r, rows in zip(missing, fetched) if persist is None or r in persist}
+        if rev and store:
+            PAYLOADS.put_many(sheet_id, rev, store)
+    return [out[r] for r in ranges]
+
+
+# ==========================================
+# 🤝 CV 月份页：整页读到后只留解析用的行，按 Drive version 落盘 + 进程内记住解析结果
+# 同一进程里的会话共用解析结果；跨进程只有两个看板跑在同一台机器、共用 PAYLOAD_DIR 时才共用落盘副本，
+# 分开部署（各自的 Streamlit 应用）时各读各的
+# ==========================================
+CV_VARIANT = "cv"
+_CV_PARSED = {}  # (sheet_id, 标签页, keyword) -> (Drive version, 解析结果)
+_CV_PARSED_LOCK = threading.Lock()
+
+
+def shared_cv_tabs(client, sheet_id, tabs, keyword, read, keep, parse):
+    """tabs 各自的解析结果（按 tabs 顺序）。同一个 Drive version、同一个 keyword 下：本进程解析过的直接用；
+    磁盘上有解析用副本（本进程或共用 PAYLOAD_DIR 的另一个看板存的）就只解析一次，不再请求；
+    都没有时 read(缺的标签页) -> [(行, 是否整页)]。
+    整页读到的行先 keep() 成解析用副本再 parse() 并落盘；只读了部分行的（比如只读标签行）不算完整副本，只给自己用。
+    read 读整页时不要再把整页落盘（cached_batch_values 的 persist），不然同一页在磁盘上占两份预算。
+    keep / parse 的结果随 keyword 变，所以副本和解析结果都按 keyword 分开存"""
+    rev = payload_revision(client, sheet_id)
+    keys = {t: f"{range_name(t)}#{CV_VARIANT}:{keyword}" for t in tabs}
+    out = {}
+    if rev:
+        with _CV_PARSED_LOCK:
+            for t in tabs:
+                hit = _CV_PARSED.get((sheet_id, t, keyword))
+                if hit and hit[0] == rev:
+                    out[t] = hit[1]
+    for t in tabs:
+        if t not in out:
+            # 整页不另外落盘，解析用副本就是这一页唯一的磁盘缓存（OFFLINE_PARSE 时用最近一次的）
+            rows = PAYLOADS.get(sheet_id, keys[t], rev) if rev else PAYLOADS.latest(sheet_id, keys[t])
+            if rows is not None:
+                out[t] = parse(rows)
+    missing = [t for t in tabs if t not in out]
+    fresh = {}
+    if missing:
+        for t, (rows, whole) in zip(missing, read(missing)):
+            if whole:
+                rows = fresh[t] = keep(rows)
+            out[t] = parse(rows)
+        if rev and fresh:
+            PAYLOADS.put_many(sheet_id, rev, {keys[t]: rows for t, rows in fresh.items()})
+    if rev:
+        with _CV_PARSED_LOCK:
+            for t in tabs:
+                if t not in missing or t in fresh:
+                    _CV_PARSED[(sheet_id, t, keyword)] = (rev, out[t])
+    return [out[t] for t in tabs]
+
+
+# ==========================================
+# 📥 整本导出：Drive files.export 一次下载 XLSX，本地逐页解析
+# ==========================================
+def export_workbook(client, sheet_id, tabs=None):
+    """返回 {标签页标题: 二维列表}，格式和 get_all_values 一致（补齐成矩形、去掉末尾空行空列）。
+    导出文件只有单元格的原始值，没有显示格式：日期是 YYYY-MM-DD，整数不带小数点"""
+    res = client.http_client.request("get", f"{DRIVE_API}/files/{sheet_id}/export", params={"mimeType": XLSX_MIME})
+    return read_xlsx(res.content, tabs)
+
+
+def read_xlsx(data, tabs=None):
+    """tabs 给了时只解析这几页（整本还是要下载，但不用的标签页不逐格转换）"""
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        titles = [t for t in wb.sheetnames if tabs is None or t in tabs]
+        return {t: _tidy([[xlsx_text(v) for v in row] for row in wb[t].iter_rows(values_only=True)])
+                for t in titles}
+    finally:
+        wb.close()
+
+
+def xlsx_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (datetime, float)):
+        return cell_text(value)
+    return str(value)
+
+
+def _tidy(rows):
+    rows = [list(r) for r in rows]
+    for r in rows:
+        while r and r[-1] == "":
+            r.pop()
+    while rows and not rows[-1]:
+        rows.pop()
+    return fill_gaps(rows) if rows else []
+
+
+def split_range(rng):
+    """range_name() 区域 -> (标签页标题, 单元格区域或 None)"""
+    if rng.endswith("'"):
+        tab, cells = rng[1:-1], None
+    else:
+        tab, cells = rng.rsplit("'!", 1)
+        tab = tab[1:]
+    return tab.replace("''", "'"), cells
+
+
+def export_range(book, rng):
+    """从导出的整本表格里切出一个 range_name() 区域；标签页不存在返回 []"""
+    tab, cells = split_range(rng)
+    rows = book.get(tab, [])
+    if cells:
+        g = a1_range_to_grid_range(cells)
+        rows = [r[g.get("startColumnIndex", 0):g.get("endColumnIndex")]
+                for r in rows[g.get("startRowIndex", 0):g.get("endRowIndex")]]
+        rows = _tidy(rows)
+    return rows
+
+
+def cached_workbook_values(client, sheet_id, ranges, fetch, call, persist=None):
+    """cached_batch_values(ranges, fetch)，fetch 是一次 values:batchGet。WORKBOOK_INGEST = "export" 时先试整本导出
+    （只解析用到的标签页），结果用 EXPORT_VARIANT 单独缓存，不会被当成 values 接口的内容读出去。
+    导出失败（超过 Drive 导出大小上限、超时 / 断线、XLSX 解析出错）时退回 values 路径；刷新的时间预算用完照常抛出"""
+    if WORKBOOK_INGEST == "export":
+        def export(missing):
+            book = call(export_workbook, client, sheet_id, {split_range(r)[0] for r in missing})
+            return None if book is None else [export_range(book, r) for r in missing]
+
+        try:
+            values = cached_batch_values(client, sheet_id, ranges, export, EXPORT_VARIANT, persist)
+            if values is not None:
+                return values
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            pass
+    return cached_batch_values(client, sheet_id, ranges, fetch, persist=persist)
+
+
+# ==========================================
+# 🧭 标签行清单：CV 月份页只读第一格是标签（公司 / 职位 / 关键字 / 阶段）的那些行
+# ==========================================
+class LayoutManifest:
+    """每个 (表格, 标签页, 标签集合) 记住标签行在第几行，由一次整页读取建立。
+    之后只 batchGet A 列 + 这些行；网格行数变了、或 A 列里标签的位置 / 内容变了就作废，重新整页读取"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._layouts = {}  # key -> (网格行数, 标签指纹, [(起始行, 结束行)])，行号 1 起
+
+    def build(self, key, rows, grid_rows):
+        labelled = [i + 1 for i, r in enumerate(rows) if r and str(r[0]).strip() in key[2]]
+        runs = []
+        for i in labelled:
+            if runs and runs[-1][1] == i - 1:
+                runs[-1][1] = i
+            else:
+                runs.append([i, i])
+        with self._lock:
+            if len(runs) <= SPARSE_MAX_RANGES:
+                self._layouts[key] = (grid_rows, _label_fingerprint(rows, key[2]), [tuple(r) for r in runs])
+            else:
+                self._layouts.pop(key, None)
+
+    def ranges(self, key, grid_rows):
+        """清单可用时返回要读的区域（A 列 + 各段标签行），否则 None"""
+        with self._lock:
+            layout = self._layouts.get(key)
+        if not layout or layout[0] != grid_rows:
+            return None
+        tab = key[1]
+        return [range_name(tab, "A:A")] + [range_name(tab, f"{s}:{e}") for s, e in layout[2]]
+
+    def assemble(self, key, values):
+        """values 对应 ranges() 的结果；返回按原顺序排列的标签行，A 列对不上时返回 None"""
+        with self._lock:
+            layout = self._layouts.get(key)
+        if not layout or _label_fingerprint(values[0], key[2]) != layout[1]:
+            return None
+        return [r for block in values[1:] for r in block]
+
+
+def _label_fingerprint(rows, labels):
+    marks = [(i, str(r[0]).strip()) for i, r in enumerate(rows) if r and str(r[0]).strip() in labels]
+    return hashlib.sha1(json.dumps(marks, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+MANIFESTS = LayoutManifest()
+
+
+def sparse_tab_values(client, sheet_id, tabs, labels, read_full, call):
+    """读多个标签页里第一格属于 labels 的行（解析时其它行本来就跳过）。
+    有清单的标签页合并成一次 batchGet；没有清单或清单失效的用 read_full(标签页列表) 整页读取，顺便建立清单。
+    返回和 tabs 顺序一致的二维列表"""
+    labels = frozenset(labels)
+    meta = get_tabs(client, sheet_id)
+    grid = {t: grid_size(meta[t])[0] for t in tabs if t in meta}
+    plan = {t: MANIFESTS.ranges((sheet_id, t, labels), grid[t]) for t in grid}
+    plan = {t: rngs for t, rngs in plan.items() if rngs}
+    out = {}
+    if plan:
+        ranges = [r for rngs in plan.values() for r in rngs]
+        values = cached_batch_values(client, sheet_id, ranges,
+                                     lambda missing: call(batch_get_values, client, sheet_id, missing))
+        if values is not None:
+            it = iter(values)
+            for t, rngs in plan.items():
+                rows = MANIFESTS.assemble((sheet_id, t, labels), [next(it) for _ in rngs])
+                if rows is not None:
+                    out[t] = rows
+    full = [t for t in tabs if t not in out]
+    if full:
+        for t, rows in zip(full, read_full(full)):
+            out[t] = rows
+            if t in grid:
+                MANIFESTS.build((sheet_id, t, labels), rows, grid[t])
+    return [out[t] for t in tabs]
+
+
+# ==========================================
+# 🚰 分段读取：按固定行数一段一段读标签页，生成器交给解析函数
+# ==========================================
+def stream_tab(client, sheet_id, tab, call, rows=None, typed=False, locate=None):
+    """按 rows（默认 STREAM_ROWS）行一段读取整个标签页，每读到一段 yield 一次（一段 = 若干行）。
+    调用方不再往下取时就不会再发请求（比如台账遇到了结束标记）。
+    typed=True 时按 UNFORMATTED_VALUE 读取：用 locate 在读到的段里找表头，之后每段的日期列批量转成 datetime，
+    locate 给出的文本列（提成比例等）再按显示的文本读一次盖回去。
+    OFFLINE_PARSE 时不分段，整页读取时缓存下来的内容当成一段给出"""
+    rows = rows or STREAM_ROWS
+    render = dict(TYPED_RENDER) if typed else {}
+    if OFFLINE_PARSE:
+        spans = [(1, None)]  # 离线时没有分段可读：整页读取时缓存下来的内容当成一段
+    else:
+        meta = get_tabs(client, sheet_id)
+        if tab not in meta:
+            return
+        total = grid_size(meta[tab])[0]
+        spans = [(start, min(start + rows - 1, total)) for start in range(1, total + 1, rows)]
+    found = None
+    for start, end in spans:
+        if end is None:
+            rng = range_name(tab)
+            window = cached_values(client, sheet_id, rng, None, "typed" if typed else None)
+        else:
+            rng = range_name(tab, f"{start}:{end}")
+            window = _first(call(batch_get_values, client, sheet_id, [rng], render))
+        if window is None:
+            raise RuntimeError(f"读取 {rng} 失败（重试次数用尽）")
+        if typed:
+            h = -1  # 这一段里表头所在的行；表头以下的行才转换
+            if found is None:
+                found = locate(window)
+                h = found[0] if found else None
+            if found:
+                window = _convert_date_columns(window, h, found[2])
+                text_cols = sorted(found[5])
+                first = start + h + 1
+                if text_cols and (end is None or first <= end):
+                    ranges = [range_name(tab, f"{column_letter(c)}{first}:{column_letter(c)}{end or ''}")
+                              for c in text_cols]
+                    text = (cached_batch_values(client, sheet_id, ranges, None) if end is None else
+                            call(batch_get_values, client, sheet_id, ranges, {"majorDimension": "COLUMNS"}))
+                    if text is None:
+                        raise RuntimeError(f"读取 {rng} 失败（重试次数用尽）")
+                    _overlay_columns(window[h + 1:], text_cols, [v[0] if v else [] for v in text])
+        yield window
+
+
+def label_rows(windows, labels):
+    """分段读到的行里只留第一格属于 labels 的行，其它行换成同一个空元组占位（行号不变，
+    LayoutManifest 照样能建清单，但不再持有这些行的内容）"""
+    labels = set(labels)
+    return [r if r and str(r[0]).strip() in labels else () for window in windows for r in window]
+
+
+# ==========================================
+# 📐 宽表按列投影：只读表头里用到的那几列
+# ==========================================
+def column_letter(col):
+    """0 起的列号 -> 列字母"""
+    return rowcol_to_a1(1, col + 1)[:-1]
+
+
+class ProjectedReader:
+    """第一次整页读取时用 locate(rows) 找到表头行和需要的列，之后每次只 batchGet：
+    表头整行（用来发现表头变化）+ 表头以下的那几列。表头一变就退回整页读取并重新定位。
+    返回的 rows 保持原来的列号（没取的列为空字符串），原有的解析函数不用改。
+    注意：结束标记（POSITION / PLACED）只在定位时出现过的列里找；之后写进别的列的标记要等下一次整页读取
+    （表头变化，或者每 PROJECT_FULL_EVERY 次读取）才会被发现。
+    typed=True 时按 UNFORMATTED_VALUE + SERIAL_NUMBER 读取：数字直接是数字，日期列按列批量转成 datetime，
+    只有被设成文本格式的单元格还是字符串（由解析函数按原来的格式列表兜底）。
+    locate 给出的文本列（提成比例：百分比格式的格子 UNFORMATTED 下是小数，150% 会变成 1.5，和表格里写的 150 / 50%
+    口径对不上）在同一次读取里另外按显示的文本读一次盖回去，结果和 formatted 读取一样"""
+
+    def __init__(self, sheet_id, tab, locate, typed=False):
+        self.sheet_id = sheet_id
+        self.tab = tab
+        # rows -> (表头行号(0起), [列号], [日期列号], 能否按追加读取, [会被原地修改的列号], [按文本读取的列号]) 或 None
+        self.locate = locate
+        self.typed = typed
+        self.layout = None  # (表头行号, 表头整行, [列号], {日期列号}, [会被原地修改的列号], {按文本读取的列号})
+        self._projected_reads = 0
+
+    def read(self, client, call):
+        """call 是各看板自己的安全调用包装（safe_api_call / safe_google_api_call）。
+        找到表头时返回 [表头] + 表头以下的行，否则原样返回整页"""
+        layout = self.layout
+        # 离线时只用整页读取的缓存（按列读取的缓存可能是别的版本的）
+        if layout and not OFFLINE_PARSE and self._projected_reads < PROJECT_FULL_EVERY:
+            self._projected_reads += 1
+            rows = self._read_columns(client, call, layout[0] + 2)
+            if rows is None or rows[0] is not None:
+                return rows and [layout[1]] + rows[1]
+        render = dict(TYPED_RENDER) if self.typed else {}
+        rows = cached_values(client, self.sheet_id, range_name(self.tab), lambda: _first(
+            call(batch_get_values, client, self.sheet_id, [range_name(self.tab)], render)), self._variant())
+        if not rows:
+            return rows
+        found = self.locate(rows)
+        if not found:
+            self.layout = None
+            return rows
+        h = found[0]
+        self.layout = (h, _trim(rows[h]), sorted(found[1]), set(found[2]), sorted(found[4]), set(found[5]))
+        self._projected_reads = 0
+        if self.typed:
+            rows = _convert_date_columns(rows, h, found[2])
+            text_cols = sorted(found[5])
+            text = self._batch(client, call, [range_name(self.tab, f"{column_letter(c)}{h + 2}:{column_letter(c)}")
+                                              for c in text_cols], set(range(len(text_cols))))
+            if text is None:
+                return None
+            _overlay_columns(rows[h + 1:], text_cols, [v[0] if v else [] for v in text])
+        return rows[h:]
+
+    def read_tail(self, client, call, n, fingerprint, watched):
+        """已经读过表头下 n 行时，只读最后 TAIL_WINDOW 行及之后的部分；会被原地修改的列（付款日期等）
+        在同一次 batchGet 里整列读，和上次的 watched 指纹核对。返回 (核对用的末尾行数 k, 末尾 k 行 + 新增行,
+        这几列从表头下开始的所有行)；表头变了、末尾指纹或整列指纹对不上（更早的行被改 / 删过）返回 None"""
+        layout = self.layout
+        if not layout:
+            return None
+        k = min(TAIL_WINDOW, n)
+        rows = self._read_columns(client, call, layout[0] + 2 + n - k, watch=True)
+        if rows is None or rows[0] is None:
+            return None
+        _, rows, body = rows
+        if len(rows) < k or tail_fingerprint(self.project(rows[:k])) != fingerprint:
+            return None
+        if self.watch_fingerprint(body, n) != watched:
+            return None
+        return k, rows, body
+
+    def watch_fingerprint(self, body, n):
+        """表头下前 n 行里会被原地修改的那几列的指纹"""
+        cells = [[str(r[c]) if c < len(r) else "" for c in self.layout[4]] for r in body[:n]]
+        cells += [[""] * len(self.layout[4])] * (n - len(cells))
+        return hashlib.sha1(json.dumps(cells, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def project(self, data):
+        """只保留投影的那几列，去掉末尾这些列全空的行（和按列读取的结果对齐）"""
+        cols = self.layout[2]
+        out = [[r[c] if c < len(r) else "" for c in cols] for r in data]
+        while out and not any(str(v).strip() for v in out[-1]):
+            out.pop()
+        return out
+
+    def _variant(self):
+        return "typed" if self.typed else None
+
+    def _batch(self, client, call, ranges, text):
+        """按列 batchGet ranges（先查磁盘缓存）；typed 时下标在 text 里的区域按显示的文本读取，
+        是另一次 batchGet，和 formatted 读取共用缓存。任何一次失败返回 None"""
+        sid = self.sheet_id
+        text = text if self.typed else set()
+        out = [None] * len(ranges)
+        groups = [([i for i in range(len(ranges)) if i not in text], self._variant()), (sorted(text), None)]
+        for idx, variant in groups:
+            if not idx:
+                continue
+            render = dict(TYPED_RENDER) if variant else {}
+            values = cached_batch_values(client, sid, [ranges[i] for i in idx], lambda missing, render=render: call(
+                batch_get_values, client, sid, missing, {"majorDimension": "COLUMNS", **render}), variant)
+            if values is None:
+                return None
+            for i, v in zip(idx, values):
+                out[i] = v
+        return out
+
+    def _read_columns(self, client, call, start, watch=False):
+        """batchGet 表头整行 + 投影列从第 start 行（1 起）往下（watch=True 时再加上会被原地修改的列，
+        从表头下第一行起整列）。返回 None（请求失败）、(None, None)（表头变了）或 (True, 重建后的行[, 整列的行])"""
+        h, header, cols, date_cols, watch_cols, text_cols = self.layout
+        watch_cols = watch_cols if watch else []
+        ranges = [range_name(self.tab, f"{h + 1}:{h + 1}")]
+        ranges += [range_name(self.tab, f"{column_letter(c)}{start}:{column_letter(c)}") for c in cols]
+        ranges += [range_name(self.tab, f"{column_letter(c)}{h + 2}:{column_letter(c)}") for c in watch_cols]
+        values = self._batch(client, call, ranges, {i for i, c in enumerate(cols + watch_cols, 1) if c in text_cols})
+        if values is None:
+            return None
+        if _trim([col[0] if col else "" for col in values[0]]) != header:
+            return None, None
+        data = [v[0] if v else [] for v in values[1:]]
+        if self.typed:
+            data = [serials_to_datetimes(d) if c in date_cols else d for c, d in zip(cols + watch_cols, data)]
+        rows = _rows_from_columns(cols, data[:len(cols)])
+        if not watch:
+            return True, rows
+        return True, rows, _rows_from_columns(watch_cols, data[len(cols):])
+
+
+def tail_fingerprint(projected_rows):
+    return hashlib.sha1(json.dumps(projected_rows[-TAIL_WINDOW:], default=str, ensure_ascii=False)
+                        .encode("utf-8")).hexdigest()
+
+
+class AppendOnlyLedger:
+    """只会在底部追加的台账：记住已解析到表头下第几行和最后几行的指纹，之后只读新增的行，
+    解析后用 merge(旧结果, 新结果) 并进去。老的行里也会被修改的列（付款日期、提成比例）每次整列读一遍
+    核对指纹。任何一个指纹对不上、新增行里出现结束标记、或者增量读了 TAIL_FULL_EVERY 次之后，
+    都整表重读重解析。"""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.value = None
+        self._lock = threading.Lock()
+        self._n = 0
+        self._fingerprint = None
+        self._watched = None
+        self._appendable = False
+        self._tail_reads = 0
+
+    def refresh(self, client, call, parse, merge):
+        """parse(rows) -> 结果；rows 总是 [表头] + 若干行。失败返回 None"""
+        with self._lock:
+            if (self.value is not None and self._appendable and not OFFLINE_PARSE
+                    and self._tail_reads < TAIL_FULL_EVERY):
+                tail = self.reader.read_tail(client, call, self._n, self._fingerprint, self._watched)
+                if tail is not None:
+                    k, rows, body = tail
+                    new = rows[k:]
+                    header = self.reader.layout[1]
+                    found = self.reader.locate([header] + new) if new else None
+                    if not new or (found and found[3]):
+                        if new:
+                            self.value = merge(self.value, parse([header] + new))
+                        self._n += len(new)
+                        self._fingerprint = tail_fingerprint(self.reader.project(rows))
+                        self._watched = self.reader.watch_fingerprint(body, self._n)
+                        self._tail_reads += 1
+                        return self.value
+            rows = self.reader.read(client, call)
+            if rows is None:
+                return None
+            self.value = parse(rows)
+            found = self.reader.locate(rows) if rows and self.reader.layout else None
+            self._appendable = bool(found and found[3])
+            if self._appendable:
+                data = self.reader.project(rows[1:])
+                self._n, self._fingerprint = len(data), tail_fingerprint(data)
+                self._watched = self.reader.watch_fingerprint(rows[1:], self._n)
+            self._tail_reads = 0
+            return self.value
+
+
+def append_frames(old, new):
+    """AppendOnlyLedger 的 merge：两个 DataFrame 首尾相接"""
+    if new.empty:
+        return old
+    if old.empty:
+        return new
+    return pd.concat([old, new], ignore_index=True)
+
+
+def append_parsed(old, new):
+    """AppendOnlyLedger 的 merge：(结果, 拒收行) 两组 DataFrame 分别首尾相接"""
+    return tuple(append_frames(o, n) for o, n in zip(old, new))
+
+
+_LEDGERS = {}
+
+
+def append_only_ledger(key, reader):
+    """进程级复用；key 区分同一张表的不同解析方式（比如不同季度的财务数据）"""
+    with _PROJECTIONS_LOCK:
+        if key not in _LEDGERS:
+            _LEDGERS[key] = AppendOnlyLedger(reader)
+        return _LEDGERS[key]
+
+
+def _first(values):
+    return values[0] if values is not None else None
+
+
+def _trim(row):
+    row = list(row)
+    while row and not str(row[-1]).strip():
+        row.pop()
+    return row
+
+
+def serials_to_datetimes(cells):
+    """一列单元格里的日期序列号一次性批量转成 datetime；文本、空单元格和小于 MIN_DATE_SERIAL 的数字原样返回"""
+    idx = [i for i, v in enumerate(cells)
+           if isinstance(v, (int, float)) and not isinstance(v, bool) and v >= MIN_DATE_SERIAL]
+    if not idx:
+        return cells
+    out = list(cells)
+    stamps = pd.to_datetime(pd.Series([cells[i] for i in idx], dtype="float64"), unit="D", origin=SHEETS_EPOCH)
+    for i, ts in zip(idx, stamps):
+        out[i] = ts.to_pydatetime()
+    return out
+
+
+def _convert_date_columns(rows, h, date_cols):
+    rows = [list(r) for r in rows]
+    for c in date_cols:
+        cells = [r[c] if c < len(r) else "" for r in rows[h + 1:]]
+        for r, v in zip(rows[h + 1:], serials_to_datetimes(cells)):
+            if c < len(r):
+                r[c] = v
+    return rows
+
+
+def _overlay_columns(rows, cols, data):
+    """按列读到的 data（cols 各一列，和 rows 逐行对齐）写回 rows；只改行里已有的格子"""
+    for c, col in zip(cols, data):
+        for r, v in zip(rows, col):
+            if c < len(r):
+                r[c] = v
+
+
+def cell_text(cell):
+    """typed 读取时的单元格 -> 原来 get_all_values 风格的字符串（日期统一成 YYYY-MM-DD，整数去掉 .0）"""
+    if isinstance(cell, datetime):
+        return cell.strftime("%Y-%m-%d")
+    if isinstance(cell, float) and cell.is_integer():
+        return str(int(cell))
+    return str(cell).strip()
+
+
+def _rows_from_columns(cols, data):
+    n = max((len(d) for d in data), default=0)
+    width = max(cols) + 1 if cols else 0
+    rows = []
+    for i in range(n):
+        row = [""] * width
+        for c, d in zip(cols, data):
+            if i < len(d):
+                row[c] = d[i]
+        rows.append(row)
+    return rows
+
+
+_PROJECTIONS = {}
+_PROJECTIONS_LOCK = threading.Lock()
+
+
+def projected_reader(sheet_id, tab, locate, typed=False):
+    """进程级复用（Streamlit 每次 rerun 都会重新执行脚本，状态要放在这里）"""
+    key = (sheet_id, tab, locate.__name__, typed)
+    with _PROJECTIONS_LOCK:
+        if key not in _PROJECTIONS:
+            _PROJECTIONS[key] = ProjectedReader(sheet_id, tab, locate, typed)
+        return _PROJECTIONS[key]
+
+
+# ==========================================
+# 🔁 进程级后台刷新：页面直接读最近一次的数据，新数据在后台准备
+# ==========================================
+class BackgroundRefresher:
+    """每个数据集一个后台线程，按 interval 定时跑 job()；刷新期间页面照常展示上一份（可能是旧的）数据。
+    超过 idle_stop 秒没有页面调用 read() 就退出线程。所有会话共用，不再每个会话各起一个线程。"""
+
+    def __init__(self, name, interval=REFRESH_INTERVAL, idle_stop=REFRESH_IDLE_STOP):
+        self.name = name
+        self.interval = interval
+        self.idle_stop = idle_stop
+        self.value = None
+        self.last_ok = None  # 最近一次成功的时间
+        self.last_error = None
+        self._job = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._attempted = threading.Event()  # 至少跑完过一次（不管成功与否）
+        self._last_read = 0.0
+
+    def read(self, job):
+        """页面每次加载时调用：登记有人在看、必要时启动后台线程，立刻返回当前数据（还没有时为 None）"""
+        with self._lock:
+            self._job = job
+            self._last_read = time.monotonic()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"refresh-{self.name}", daemon=True)
+                self._thread.start()
+        return self.value
+
+    def wait(self, timeout=FLIGHT_TIMEOUT):
+        """还没有任何数据时等第一次刷新跑完；超时抛 TimeoutError，刷新失败返回 None（看 last_error）"""
+        if not self._attempted.wait(timeout):
+            raise TimeoutError(f"{self.name}: 首次刷新超过 {timeout} 秒")
+        return self.value
+
+    def publish(self, value):
+        """手动刷新的结果也放进来，其它会话马上能读到"""
+        with self._lock:
+            self.value = value
+            self.last_ok = datetime.now()
+            self.last_error = None
+        self._attempted.set()
+
+    def status(self):
+        with self._lock:
+            running = self._thread is not None and self._thread.is_alive()
+            return {"running": running, "last_ok": self.last_ok, "last_error": self.last_error,
+                    "interval": self.interval}
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if time.monotonic() - self._last_read > self.idle_stop:
+                    self._thread = None
+                    return
+                job = self._job
+            try:
+                self.publish(job())
+            except Exception as e:
+                with self._lock:
+                    self.last_error = f"{type(e).__name__}: {e}"
+                self._attempted.set()
+            time.sleep(self.interval)
+
+
+_REFRESHERS = {}
+_REFRESHERS_LOCK = threading.Lock()
+
+
+def background_refresher(name, interval=REFRESH_INTERVAL):
+    with _REFRESHERS_LOCK:
+        if name not in _REFRESHERS:
+            _REFRESHERS[name] = BackgroundRefresher(name, interval)
+        return _REFRESHERS[name]
+
+
+# ==========================================
+# ⏳ 刷新时间预算 + 熔断：慢的 / 一直失败的数据源不再拖住整个页面
+# ==========================================
+class CircuitBreaker:
+    """按 spreadsheet 计连续失败次数，达到 failures 次后 cooldown 秒内直接跳过；到期后放行一次，成功即恢复"""
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state = {}  # sheet_id -> [连续失败次数, 熔断截止时间]
+
+    def allow(self, sheet_id):
+        with self._lock:
+            return self._state.get(sheet_id, [0, 0.0])[1] <= time.monotonic()
+
+    def success(self, sheet_id):
+        with self._lock:
+            self._state.pop(sheet_id, None)
+
+    def failure(self, sheet_id):
+        with self._lock:
+            st = self._state.setdefault(sheet_id, [0, 0.0])
+            st[0] += 1
+            if st[0] >= self.failures:
+                st[1] = time.monotonic() + self.cooldown
+
+    def open_ids(self):
+        now = time.monotonic()
+        with self._lock:
+            return [sid for sid, (_, until) in self._state.items() if until > now]
+
+
+BREAKERS = CircuitBreaker()
+_SNAPSHOTS = {}  # (sheet_id, 数据集) -> (最近一次成功的结果, 时间)
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+def run_with_deadline(tasks, deadline=REFRESH_DEADLINE):
+    """tasks: {(sheet_id, 数据集): fn}，每个数据源一个线程同时执行（在途请求数由 API_SLOTS / LIMITER 控制），最多等 deadline 秒。
+    超时、失败或熔断中的数据源返回上一次成功的结果，并记进 stale：{key: 那份结果的时间}（从没成功过时结果和时间都是 None）。
+    超时的任务不会被打断，之后跑完仍会更新快照，下次刷新就能用上。返回 (results, stale)"""
+    end = time.monotonic() + deadline
+    ctx = get_script_run_ctx(suppress_warning=True)
+
+    def run(key, fn):
+        if ctx:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        sid = key[0]
+        if not BREAKERS.allow(sid):
+            raise CircuitOpen(sid)
+        _local.deadline = end
+        try:
+            value = fn()
+        except Exception:
+            BREAKERS.failure(sid)
+            raise
+        finally:
+            _local.deadline = None
+        BREAKERS.success(sid)
+        with _SNAPSHOTS_LOCK:
+            _SNAPSHOTS[key] = (value, datetime.now())
+        return value
+
+    if not tasks:
+        return {}, {}
+    pool = ThreadPoolExecutor(max_workers=len(tasks))
+    futures = {key: pool.submit(run, key, fn) for key, fn in tasks.items()}
+    pool.shutdown(wait=False)
+    wait(list(futures.values()), timeout=max(0.0, end - time.monotonic()))
+    results, stale = {}, {}
+    for key, fut in futures.items():
+        if fut.done() and fut.exception() is None:
+            results[key] = fut.result()
+            continue
+        with _SNAPSHOTS_LOCK:
+            value, as_of = _SNAPSHOTS.get(key, (None, None))
+        results[key], stale[key] = value, as_of
+    return results, stale
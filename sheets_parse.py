@@ -0,0 +1,479 @@
+import threading
+import unicodedata
+from datetime import datetime
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from sheets_io import cell_text
+
+# ==========================================
+# 📊 CV 月份页解析（head.py / Supervisor.py 共用）
+# 先按行挑出可能有用的行（第一格是标签，或者整行文本里带关键字），把这些行一次转成二维数组，
+# 只对非空格子去空格；公司 / 职位 / 关键字 / 阶段都用整列比较和掩码算，不再逐行逐格地在 Python 里循环
+# ==========================================
+TEXT = np.dtypes.StringDType()
+# 两个看板认同一套标签（第一格），同一份解析结果才能共用
+CV_COMPANY_KEYS = ["Company", "Client", "Cliente", "公司", "公司名称", "客户"]
+CV_POSITION_KEYS = ["Position", "Role", "Posición", "职位", "岗位"]
+CV_STAGE_KEYS = ["Stage", "Status", "阶段"]
+CV_LABELS = CV_COMPANY_KEYS + CV_POSITION_KEYS + CV_STAGE_KEYS
+
+
+def candidate_rows(rows, labels, keyword=None):
+    """第一格（去空格后）属于 labels 的行；给了 keyword 时再加上整行文本里出现 keyword 的行。保持原顺序"""
+    labels = set(labels)
+    keep = []
+    for r in rows:
+        if not r:
+            continue
+        if str(r[0]).strip() in labels:
+            keep.append(r)
+        elif keyword is not None and keyword in row_text(r):
+            keep.append(r)
+    return keep
+
+
+def row_text(row):
+    try:
+        return "\x00".join(row)
+    except TypeError:  # 有非字符串单元格（数字等）
+        return "\x00".join(map(str, row))
+
+
+class CvGrid:
+    """所有格子摊平成一维后一次处理（不用补齐成矩形）。
+    r / c / text：去空格后非空的格子（行优先顺序）；first / second：每行第一 / 二格（second 是原始文本）；
+    lens：每行原本的长度；width：最长一行的长度"""
+
+    def __init__(self, rows):
+        self.lens = np.fromiter((len(r) for r in rows), dtype=np.int64, count=len(rows))
+        self.width = max(int(self.lens.max(initial=0)), 2)
+        flat = np.array(list(chain.from_iterable(rows)), dtype=object)
+        starts = np.cumsum(self.lens) - self.lens
+        idx = np.flatnonzero(flat != "")
+        r = np.searchsorted(starts, idx, side="right") - 1
+        text = np.strings.strip(flat[idx].astype(TEXT))
+        keep = text != ""
+        self.r, self.c, self.text = r[keep], (idx - starts[r])[keep], text[keep]
+        self.first = np.strings.strip(np.array([row[0] for row in rows], dtype=object).astype(TEXT))
+        self.second = np.array([row[1] if len(row) > 1 else "" for row in rows], dtype=object)
+
+    def label_values(self, default, stripped=True):
+        """每行第二格的值（行里只有标签本身时用 default），object 数组"""
+        second = np.strings.strip(self.second.astype(TEXT)).astype(object) if stripped else self.second
+        return np.where(self.lens > 1, second, default).astype(object)
+
+
+def forward_fill(mask, values, default):
+    """每行取它上面（含自己）最近一个 mask 行的 values，之前没有时用 default"""
+    last = np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+    return np.where(last >= 0, values[np.maximum(last, 0)], default)
+
+
+def last_by_key(keys, values):
+    """同一个 key 取最后出现的值；返回 (排好序的 key, 对应的值)"""
+    uniq, idx = np.unique(keys[::-1], return_index=True)
+    return uniq, values[::-1][idx]
+
+
+def cv_rows(rows, keyword):
+    """CV 月份页里解析要用的行（两个看板的口径都够用）：第一格是标签 / 关键字，或者整行文本里带关键字。
+    两个看板共用的“解析用副本”就是这些行"""
+    return candidate_rows(rows, CV_LABELS + [keyword], keyword)
+
+
+class CvTab:
+    """一个 CV 月份页扫一遍的结果，两个看板共用。rows 只遍历一次，可以是分段读取的生成器。
+    候选人 = 关键字行里第一个关键字右边的非空格子（cand_r / cand_c，行优先顺序）；
+    每行是不是公司 / 职位 / 阶段标签行也只算一次。counts() 是 head.py 的口径，funnel() 是 Supervisor.py 的口径"""
+
+    def __init__(self, rows, keyword):
+        rows = cv_rows(rows, keyword)
+        self.keyword = keyword
+        self.n = len(rows)
+        if not rows:
+            return
+        g = self.g = CvGrid(rows)
+        hit = g.text == keyword
+        self.key_col = np.full(self.n, g.width, dtype=np.int64)
+        np.minimum.at(self.key_col, g.r[hit], g.c[hit])  # 每行第一个关键字所在列
+        cand = g.c > self.key_col[g.r]
+        self.cand_r, self.cand_c = g.r[cand], g.c[cand]
+        self.comp = np.isin(g.first, CV_COMPANY_KEYS)
+        self.pos = ~self.comp & np.isin(g.first, CV_POSITION_KEYS)
+        self.stage = np.isin(g.first, CV_STAGE_KEYS)
+
+    def counts(self, consultant, month):
+        """head.py 的口径：每个候选人格子算一个，公司 / 职位取上面最近一次出现的标签行（关键字行不算标签行）。
+        返回 (count, details)"""
+        if not self.n or not len(self.cand_r):
+            return 0, []
+        g = self.g
+        counts = np.bincount(self.cand_r, minlength=self.n)
+        key_rows = self.key_col < g.width
+        comp, pos = ~key_rows & self.comp, ~key_rows & self.pos
+        labels = g.label_values("Unknown")
+        company = np.repeat(forward_fill(comp, labels, "Unknown"), counts).tolist()
+        position = np.repeat(forward_fill(pos, labels, "Unknown"), counts).tolist()
+        det = [{"Consultant": consultant, "Company": c, "Position": p, "Month": month, "Count": 1}
+               for c, p in zip(company, position)]
+        return len(det), det
+
+    def funnel(self, consultant, month):
+        """Supervisor.py 的口径：公司行开始一个新区块；区块里第一格是关键字的行给出候选人（按列），阶段行给出
+        各列的状态，同一列后出现的值覆盖前面的，职位取区块里最后一个职位行。返回 (sent, int, off, details)"""
+        if not self.n:
+            return 0, 0, 0, []
+        g = self.g
+        comp, pos = self.comp, self.pos
+        name_rows = ~comp & ~pos & (g.first == self.keyword)
+        stage_rows = ~comp & ~pos & ~name_rows & self.stage
+        block = np.cumsum(comp)
+
+        sel = (name_rows | stage_rows)[g.r] & (g.c > 0)  # 已经是行优先，和原来逐行逐列的顺序一致
+        r, c, text = g.r[sel], g.c[sel], g.text[sel]
+        keys = block[r] * g.width + c  # 区块 × 列 = 一个候选人
+        uniq, first_seen = np.unique(keys, return_index=True)
+        cands = uniq[np.argsort(first_seen, kind="stable")]  # 按第一次出现的顺序
+        cands = cands[np.isin(cands, keys[name_rows[r]])]  # 只有阶段没有名字的列不算
+        if not len(cands):
+            return 0, 0, 0, []
+
+        is_stage = stage_rows[r]
+        stage = np.full(len(cands), "sent", dtype=TEXT)
+        if is_stage.any():
+            skeys, svals = last_by_key(keys[is_stage], text[is_stage])
+            at = np.searchsorted(skeys, cands).clip(max=len(skeys) - 1)
+            found = skeys[at] == cands
+            stage[found] = svals[at[found]]
+        # 阶段的写法就那么几种：先去重，只对不同的值做字符串判断
+        kinds, which = np.unique(stage, return_inverse=True)
+        kinds = np.strings.lower(kinds)
+        off_kind = np.strings.find(kinds, "offer") >= 0
+        int_kind = (np.strings.find(kinds, "interview") >= 0) | (np.strings.find(kinds, "面试") >= 0) | off_kind
+        is_off, is_int = off_kind[which], int_kind[which]
+
+        labels = g.label_values("Unk", stripped=False)
+        companies = np.concatenate([np.array(["Unk"], dtype=object), labels[comp]])  # 区块 0 是第一个公司行之前的部分
+        positions = np.full(len(companies), "Unk", dtype=object)
+        pos_blocks, pos_vals = last_by_key(block[pos], labels[pos])
+        positions[pos_blocks] = pos_vals
+        cand_block = cands // g.width
+        status = np.where(is_off, "Offered", np.where(is_int, "Interviewed", "Sent")).tolist()
+        det = [{"Consultant": consultant, "Month": month, "Company": co, "Position": p, "Status": st, "Count": 1}
+               for co, p, st in zip(companies[cand_block].tolist(), positions[cand_block].tolist(), status)]
+        return len(cands), int(is_int.sum()), int(is_off.sum()), det
+
+
+# ==========================================
+# 👥 顾问名解析：名单建一次索引，之后每个原名 O(1) 查到（和名单大小无关）
+# ==========================================
+class _StripMarks(dict):
+    """str.translate 用的表：组合附加符号（Mn，比如 NFD 拆出来的重音）映射成删除，第一次遇到时查一次类别"""
+
+    def __missing__(self, code):
+        self[code] = None if unicodedata.category(chr(code)) == 'Mn' else code
+        return self[code]
+
+
+_MARKS = _StripMarks()
+
+
+def fold_name(text):
+    """去掉重音再转小写（和原来逐个字符查 unicodedata.category 的 normalize_text 结果一样）"""
+    return unicodedata.normalize('NFD', str(text)).translate(_MARKS).lower()
+
+
+class AliasResolver:
+    """原名 -> 名单里的名字。口径和原来逐个比较一样：规范化后名单里的名字包含在原名里、或者原名包含在
+    名单里的名字里都算匹配，有多个时取名单里靠前的，同时记进 ambiguous。
+    索引建一次：名单名字的所有子串 -> 下标（原名是名字的一部分时一次查到）、名字 -> 下标（对原名按名单里
+    出现过的长度切片去查），每个原名解析一次就记住。normalize 默认是 fold_name"""
+
+    def __init__(self, names, normalize=fold_name):
+        self.names = list(names)
+        self.normalize = normalize
+        self._exact = {}  # 规范化的名字 -> [下标]
+        self._parts = {}  # 规范化的名字的子串 -> [下标]
+        for i, name in enumerate(self.names):
+            n = normalize(name)
+            self._exact.setdefault(n, []).append(i)
+            for part in {n[a:b] for a in range(len(n) + 1) for b in range(a, len(n) + 1)}:
+                self._parts.setdefault(part, []).append(i)
+        self._sizes = sorted({len(n) for n in self._exact})
+        self._memo = {}
+        self.ambiguous = {}  # 原名 -> 匹配到的所有名字（用的是第一个）
+
+    def matches(self, raw):
+        """raw 能匹配上的所有名单下标（从小到大）"""
+        n = self.normalize(raw)
+        hits = set(self._parts.get(n, ()))
+        for size in self._sizes:
+            if size > len(n):
+                break
+            for a in range(len(n) - size + 1):
+                hits.update(self._exact.get(n[a:a + size], ()))
+        return sorted(hits)
+
+    def containing(self, raw):
+        """规范化后包含 raw 的名单下标（从小到大）"""
+        return self._parts.get(self.normalize(raw), [])
+
+    def resolve(self, raw):
+        """名单里的名字，对不上时 None"""
+        if raw not in self._memo:
+            hits = self.matches(raw)
+            if len(hits) > 1:
+                self.ambiguous[raw] = [self.names[i] for i in hits]
+            self._memo[raw] = self.names[hits[0]] if hits else None
+        return self._memo[raw]
+
+
+_RESOLVERS = {}
+_RESOLVERS_LOCK = threading.Lock()
+
+
+def alias_resolver(names):
+    """同一份名单进程里只建一个 AliasResolver（Streamlit 每次 rerun 都会重新执行脚本，状态要放在这里）：
+    台账是后台刷新线程解析的，ambiguous 要记在页面之后读得到的同一个实例上"""
+    key = tuple(names)
+    with _RESOLVERS_LOCK:
+        if key not in _RESOLVERS:
+            _RESOLVERS[key] = AliasResolver(key)
+        return _RESOLVERS[key]
+
+
+# ==========================================
+# 💰 Positions 台账解析（head.py / Supervisor.py 共用）
+# 整张台账摊平成一维，每一步都是整列操作：日期列先用样本猜出格式再整列 to_datetime，
+# 薪资 / 百分比整列去掉符号后一次转成 float，顾问名每种写法只匹配一次；丢掉的行记进拒收表
+# ==========================================
+REJECT_COLUMNS = ["Consultant", "Onboarding Date", "Reason"]
+DATE_SNIFF_ROWS = 50
+
+
+class LedgerGrid:
+    """表头以下的行摊平成一维。flat：原始格子；raw：str(格子)；text：去空格后的 raw；
+    lens / starts：每行的长度和第一格在一维数组里的位置"""
+
+    def __init__(self, rows):
+        self.lens = np.fromiter((len(r) for r in rows), dtype=np.int64, count=len(rows))
+        self.starts = np.cumsum(self.lens) - self.lens
+        self.flat = np.array(list(chain.from_iterable(rows)), dtype=object)
+        self.raw = self.flat.astype(TEXT)
+        self.text = np.strings.strip(self.raw)
+        self.cell_row = np.repeat(np.arange(len(rows)), self.lens)
+
+    def body(self):
+        """要解析的行：非空、且在第一个结束标记行（有 POSITION 没有 PLACED）之前。返回 (行号, 有没有遇到结束标记)"""
+        n = len(self.lens)
+        filled = np.bincount(self.cell_row[self.text != ""], minlength=n) > 0
+        # numpy 的 upper 先粗筛，候选格子再按原来的写法（lower 再 upper）确认
+        up = np.strings.upper(self.text)
+        cand = np.flatnonzero((np.strings.find(up, "POSITION") >= 0) | (np.strings.find(up, "PLACED") >= 0))
+        words = [t.lower().upper() for t in self.text[cand].tolist()]
+        pos = np.bincount(self.cell_row[cand[["POSITION" in w for w in words]]], minlength=n) > 0
+        placed = np.bincount(self.cell_row[cand[["PLACED" in w for w in words]]], minlength=n) > 0
+        stop = np.flatnonzero(pos & ~placed)
+        end = stop[0] if len(stop) else n
+        return np.flatnonzero(filled[:end]), bool(len(stop))
+
+    def cells(self, rows, col):
+        """rows 这些行的第 col 格（负数和 Python 下标一样从行尾数）：返回 (一维下标, 这一格存不存在)"""
+        lens = self.lens[rows]
+        at = lens + col if col < 0 else np.full(len(rows), col)
+        has = (at >= 0) & (at < lens)
+        return np.where(has, self.starts[rows] + at, 0), has
+
+    def texts(self, idx, has=None):
+        """cell_text 的整列版本（object 数组）；has 为假的位置是空字符串"""
+        out = self.text[idx].astype(object)
+        odd = np.flatnonzero([type(v) is not str for v in self.flat[idx]])
+        if len(odd):
+            out[odd] = [cell_text(v) for v in self.flat[idx[odd]]]
+        if has is not None:
+            out[~has] = ""
+        return out
+
+    def typed_dates(self, idx):
+        """typed 读取时已经是 datetime 的格子：返回 (是不是 datetime, datetime64[us])"""
+        values = self.flat[idx]
+        typed = np.array([isinstance(v, datetime) for v in values], dtype=bool)
+        out = np.full(len(idx), np.datetime64("NaT", "us"))
+        if typed.any():
+            out[typed] = np.array(values[typed].tolist(), dtype="datetime64[us]")
+        return typed, out
+
+    def dates(self, idx, formats):
+        """datetime 格子直接用，其余按 cell_text 后的文本解析。返回 datetime64[us]（NaT = 解析不了）"""
+        typed, out = self.typed_dates(idx)
+        rest = np.flatnonzero(~typed)
+        if len(rest):
+            out[rest] = parse_dates(self.texts(idx[rest]), formats)
+        return out
+
+
+def sniff_format(text, formats):
+    """前 DATE_SNIFF_ROWS 个非空值里能解析最多的格式（一样多时取列表里靠前的），返回下标"""
+    sample = text[text != ""][:DATE_SNIFF_ROWS]
+    if not len(sample):
+        return 0
+    return int(np.argmax([(~np.isnat(_to_dates(sample, f))).sum() for f in formats]))
+
+
+def _to_dates(text, fmt):
+    return pd.to_datetime(text, format=fmt, errors="coerce").to_numpy().astype("datetime64[us]")
+
+
+def parse_dates(text, formats):
+    """和逐个格子按 formats 顺序 strptime、第一个成功的算数结果一样（解析不了的是 NaT）。
+    先整列用猜出来的格式转换；排在它前面的格式只再核对已经转换出来的格子，后面的格式只试剩下的"""
+    text = np.asarray(text, dtype=object)
+    out = np.full(len(text), np.datetime64("NaT", "us"))
+    rank = np.full(len(text), len(formats))  # 每个格子是第几个格式解析出来的
+    todo = text != ""
+    k = sniff_format(text, formats)
+    for j in [k] + [j for j in range(len(formats)) if j != k]:
+        idx = np.flatnonzero(todo & (rank > j))
+        if not len(idx):
+            continue
+        got = _to_dates(text[idx], formats[j])
+        ok = ~np.isnat(got)
+        out[idx[ok]], rank[idx[ok]] = got[ok], j
+    return out
+
+
+def date_strings(values):
+    """datetime64 -> strftime("%Y-%m-%d") 的结果（四位以下的年份和 strftime 一样不补零）"""
+    out = np.datetime_as_string(values, unit="D").astype(object)
+    small = np.flatnonzero(values.astype("datetime64[Y]").astype(np.int64) + 1970 < 1000)
+    if len(small):
+        out[small] = [d.strftime("%Y-%m-%d") for d in values[small].tolist()]
+    return out
+
+
+def to_floats(text):
+    """和逐个 float() 一样（StringDType 转 float64 用的是同一套规则）。返回 (值, 能否转换)，转换不了的值为 0"""
+    out = np.zeros(len(text))
+    ok = text != ""
+    try:
+        out[ok] = text[ok].astype(np.float64)
+    except ValueError:  # 有不是数字的文本：每种写法单独试一次
+        uniq, inv = np.unique(text[ok], return_inverse=True)
+        parsed = [_float(u) for u in uniq.tolist()]
+        where = np.flatnonzero(ok)
+        out[where] = np.array([0.0 if v is None else v for v in parsed])[inv]
+        ok[where] = np.array([v is not None for v in parsed], dtype=bool)[inv]
+    return out, ok
+
+
+def _float(s):
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def match_names(names, match):
+    """每种写法只调一次 match（原名 -> 顾问名，对不上时 None）；对不上的为空字符串，object 数组"""
+    uniq, inv = np.unique(np.asarray(names, dtype=object).astype(TEXT), return_inverse=True)
+    return np.array([match(u) or "" for u in uniq.tolist()] + [""], dtype=object)[inv]
+
+
+def parse_ledger_chunks(chunks, header, required, date_formats, salary_noise, match, keep=None,
+                        payment_dates=False):
+    """按段给出的台账（chunks 是若干段行，可以是边读边给的生成器），每段整列解析后拼起来。
+    header(行) 认出表头时返回各列的列号：consultant / onboard / salary（-1 = 行里最后一格）、
+    pct / payment（-1 = 没有这一列）；表头之前的行不解析。required 是行至少要覆盖到的那几列的名字。
+    遇到结束标记后不再往下取。返回 (各列数组的 dict, 拒收 DataFrame)，没找到表头时 dict 为 None"""
+    cols, parts, rejects = None, [], []
+    for rows in chunks:
+        if cols is None:
+            for h, row in enumerate(rows):
+                cols = header(row)
+                if cols is not None:
+                    rows = rows[h + 1:]
+                    break
+            else:
+                continue
+        led, rej, stopped = parse_ledger(rows, cols, [cols[k] for k in required], date_formats, salary_noise,
+                                         match, keep, payment_dates)
+        parts.append(led)
+        rejects.append(rej)
+        if stopped:
+            break
+    rejects = pd.concat([r for r in rejects if len(r)] or [pd.DataFrame(columns=REJECT_COLUMNS)],
+                        ignore_index=True)
+    if cols is None:
+        return None, rejects
+    parts = [p for p in parts if len(p["consultant"])] or parts[:1]  # 空的段不参与拼接（免得改变列的类型）
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}, rejects
+
+
+def parse_ledger(rows, cols, required, date_formats, salary_noise, match, keep=None, payment_dates=False):
+    """rows：表头以下的行（一段）；required：行至少要覆盖到的列号。口径和原来逐行解析完全一样：
+    空行跳过，遇到结束标记停止；行长度不超过 max(required)、没有顾问名、入职日期解析不了、顾问对不上的行
+    丢掉并记进拒收表；keep(入职日期) 为假的行直接丢掉（比如不在本季度，不算拒收）。
+    payment_dates=True 时付款日期也按 date_formats 解析。返回 (各列数组的 dict, 拒收 DataFrame, 是否遇到结束标记)"""
+    g = LedgerGrid(rows)
+    sel, stopped = g.body()
+    reason = np.full(len(sel), "", dtype=object)
+    reason[g.lens[sel] <= max(required)] = "short row"
+    names = g.texts(*g.cells(sel, cols["consultant"]))
+    reason[(reason == "") & (names == "")] = "no consultant"
+    on_idx, on_has = g.cells(sel, cols["onboard"])
+    onboard = np.full(len(sel), np.datetime64("NaT", "us"))
+    live = np.flatnonzero(reason == "")
+    onboard[live] = g.dates(on_idx[live], date_formats)
+    reason[live[np.isnat(onboard[live])]] = "bad onboarding date"
+    drop = np.zeros(len(sel), dtype=bool)  # keep 不要的行：直接丢掉，不算拒收
+    if keep is not None:
+        live = np.flatnonzero(reason == "")
+        drop[live] = ~keep(onboard[live])
+    matched = np.full(len(sel), "", dtype=object)
+    live = np.flatnonzero((reason == "") & ~drop)
+    matched[live] = match_names(names[live], match)
+    reason[live[matched[live] == ""]] = "unknown consultant"
+
+    bad = np.flatnonzero(reason != "")
+    rejects = pd.DataFrame({"Consultant": names[bad].tolist(),
+                            "Onboarding Date": g.texts(on_idx[bad], on_has[bad]).tolist(),
+                            "Reason": reason[bad].tolist()}, columns=REJECT_COLUMNS)
+    ok = np.flatnonzero((reason == "") & ~drop)
+    rows_ok = sel[ok]
+
+    sal_idx, sal_has = g.cells(rows_ok, cols["salary"])
+    sal_text = g.raw[sal_idx]
+    for token in salary_noise:  # 和原来一样按顺序一个个去掉
+        sal_text = np.strings.replace(sal_text, token, "")
+    salary, sal_ok = to_floats(np.strings.strip(sal_text))
+    sal_ok &= sal_has
+    salary[~sal_ok] = 0
+    if len(ok) and not sal_ok.any():
+        salary = salary.astype(np.int64)  # 原来转换失败时记的是整数 0，全部失败时整列是整数
+
+    pct = np.ones(len(ok))
+    if cols["pct"] != -1:
+        p_idx, p_has = g.cells(rows_ok, cols["pct"])
+        p_val, p_ok = to_floats(np.strings.strip(np.strings.replace(g.raw[p_idx], "%", "")))
+        p_ok &= p_has
+        pct[p_ok] = np.where(p_val[p_ok] > 1.0, p_val[p_ok] / 100.0, p_val[p_ok])
+
+    pay_text = np.full(len(ok), "", dtype=object)
+    pay_date = np.full(len(ok), np.datetime64("NaT", "us"))
+    if cols["payment"] != -1:
+        pay_idx, pay_has = g.cells(rows_ok, cols["payment"])
+        pay_text = g.texts(pay_idx, pay_has)
+        if payment_dates:
+            typed, values = g.typed_dates(pay_idx)
+            typed &= pay_has
+            pay_date[typed] = values[typed]
+            rest = np.flatnonzero(~typed & (np.strings.str_len(pay_text.astype(TEXT)) > 5))
+            pay_date[rest] = parse_dates(pay_text[rest], date_formats)
+
+    gp = salary * np.where(salary < 20000, 1.0, 1.5) * pct
+    return {"consultant": matched[ok], "gp": gp, "salary": salary, "pct": pct, "onboard": onboard[ok],
+            "pay_text": pay_text, "paid": np.strings.str_len(pay_text.astype(TEXT)) > 5,
+            "pay_date": pay_date}, rejects, stopped
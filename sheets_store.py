@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import pandas as pd
+
+# ==========================================
+# 💾 本地磁盘存储（进程 / 会话重启后仍然有效）
+# ==========================================
+ARCHIVE_DIR = os.environ.get("CV_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cv_archive"))
+DETAIL_COLUMNS = ["Consultant", "Company", "Position", "Month", "Count"]
+PAYLOAD_DIR = os.environ.get("PAYLOAD_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".payload_cache"))
+PAYLOAD_BUDGET = int(os.environ.get("PAYLOAD_CACHE_BYTES", 256 * 1024 * 1024))  # 压缩后的总字节上限
+
+
+def archive_cutoff(today=None):
+    """上一个季度第一个月（YYYYMM）；比它更早的月份视为已结束，可以归档"""
+    today = today or datetime.now()
+    q = (today.month - 1) // 3 + 1
+    if q == 1:
+        return f"{today.year - 1}10"
+    return f"{today.year}{(q - 2) * 3 + 1:02d}"
+
+
+# ==========================================
+# 🗄️ 已结束月份的 CV 归档：每个 顾问×月份 一个 parquet 文件，写一次后只读
+# ==========================================
+class MonthArchive:
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, sheet_id, month):
+        return os.path.join(self.root, sheet_id, f"{month}.parquet")
+
+    def is_closed(self, sheet_id, month):
+        return os.path.exists(self._path(sheet_id, month))
+
+    def closed_months(self, sheet_id):
+        folder = os.path.join(self.root, sheet_id)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(f[:-len(".parquet")] for f in os.listdir(folder) if f.endswith(".parquet"))
+
+    def load(self, sheet_id, month):
+        """返回和 parse_cv_rows 相同的 (count, details)"""
+        df = pd.read_parquet(self._path(sheet_id, month))
+        return len(df), df.to_dict("records")
+
+    def close(self, sheet_id, month, details):
+        """写入并封存；已封存的月份不会被覆盖"""
+        path = self._path(sheet_id, month)
+        with self._lock:
+            if os.path.exists(path):
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            df = pd.DataFrame(details, columns=DETAIL_COLUMNS).astype({"Month": str, "Count": int})
+            tmp = f"{path}.tmp"
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, path)  # 原子替换，避免读到写了一半的文件
+
+    def reopen(self, sheet_id, month):
+        """手动解封：删除归档文件，下次读取会重新从 Sheets 拉取"""
+        with self._lock:
+            try:
+                os.remove(self._path(sheet_id, month))
+            except FileNotFoundError:
+                pass
+
+
+ARCHIVE = MonthArchive()
+
+
+# ==========================================
+# 📦 原始表格内容缓存：get_all_values 的结果按 (表格, 标签页, Drive version) 落盘
+# ==========================================
+@contextmanager
+def _file_lock(path):
+    """跨进程的互斥锁（head.py / Supervisor.py 是两个进程，共用同一个缓存目录）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class PayloadCache:
+    """zlib 压缩的 JSON，文件名是内容的 sha256（相同内容只存一份）。
+    index.json 记录 key -> digest / 大小 / 最近使用时间，超过字节预算按 LRU 淘汰。
+    多个进程共用一个目录：index.json 变了就重新读；写入时先加文件锁、重新读一遍再合并，
+    只删合并后的索引里没有任何 key 引用的 blob"""
+
+    def __init__(self, root=PAYLOAD_DIR, budget=PAYLOAD_BUDGET):
+        self.root = root
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._index = None
+        self._stamp = None  # 读到的 index.json 的 (mtime, 大小)
+        self._touched = {}  # 命中过的 key -> 使用时间，下次写索引时合并进去
+
+    @staticmethod
+    def _key(sheet_id, tab, revision):
+        return f"{sheet_id}|{tab}|{revision}"
+
+    def _blob(self, digest):
+        return os.path.join(self.root, "blobs", f"{digest}.z")
+
+    def _index_stamp(self):
+        try:
+            st = os.stat(os.path.join(self.root, "index.json"))
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load_index(self):
+        """index.json 被（别的进程）改过就重新读"""
+        stamp = self._index_stamp()
+        if self._index is None or stamp != self._stamp:
+            try:
+                with open(os.path.join(self.root, "index.json"), encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+            self._stamp = stamp
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, "index.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(f"{path}.tmp", path)
+        self._stamp = self._index_stamp()
+
+    def _read(self, entry):
+        with open(self._blob(entry["digest"]), "rb") as f:
+            return json.loads(zlib.decompress(f.read()).decode("utf-8"))
+
+    def get(self, sheet_id, tab, revision):
+        """命中返回二维列表，否则 None"""
+        with self._lock:
+            entry = self._load_index().get(self._key(sheet_id, tab, revision))
+            if not entry:
+                return None
+            try:
+                rows = self._read(entry)
+            except (OSError, ValueError, zlib.error):
+                self._index.pop(self._key(sheet_id, tab, revision), None)
+                return None
+            entry["used"] = self._touched[self._key(sheet_id, tab, revision)] = time.time()
+            return rows
+
+    def latest(self, sheet_id, tab):
+        """不管版本，取这个标签页最近一次缓存的内容（离线重跑解析用）"""
+        prefix = f"{sheet_id}|{tab}|"
+        with self._lock:
+            entries = [e for k, e in self._load_index().items() if k.startswith(prefix)]
+            for entry in sorted(entries, key=lambda e: e["stored"], reverse=True):
+                try:
+                    return self._read(entry)
+                except (OSError, ValueError, zlib.error):
+                    continue
+        return None
+
+    def put(self, sheet_id, tab, revision, rows):
+        self.put_many(sheet_id, revision, {tab: rows})
+
+    def put_many(self, sheet_id, revision, payloads):
+        """payloads: {标签页/区域: 二维列表}；一次写索引"""
+        blobs = {}
+        for tab, rows in payloads.items():
+            data = zlib.compress(json.dumps(rows, ensure_ascii=False).encode("utf-8"))
+            blobs[tab] = (hashlib.sha256(data).hexdigest(), data)
+        with self._lock, _file_lock(os.path.join(self.root, "index.lock")):
+            self._index = None  # 拿到锁之后总是重新读，合并别的进程刚写进去的条目
+            index = self._load_index()
+            for k, used in self._touched.items():
+                if k in index:
+                    index[k]["used"] = max(index[k]["used"], used)
+            self._touched.clear()
+            now = time.time()
+            for tab, (digest, data) in blobs.items():
+                # 同一个标签页的旧版本不会再被命中，直接丢掉
+                prefix = f"{sheet_id}|{tab}|"
+                for k in [k for k in index if k.startswith(prefix)]:
+                    del index[k]
+                path = self._blob(digest)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(f"{path}.tmp", "wb") as f:
+                        f.write(data)
+                    os.replace(f"{path}.tmp", path)
+                index[self._key(sheet_id, tab, revision)] = {"digest": digest, "size": len(data), "used": now,
+                                                             "stored": now}
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        index = self._index
+        refs = Counter(e["digest"] for e in index.values())
+        sizes = {e["digest"]: e["size"] for e in index.values()}
+        total = sum(sizes.values())
+        for k in sorted(index, key=lambda k: index[k]["used"]):
+            if total <= self.budget:
+                break
+            digest = index.pop(k)["digest"]
+            refs[digest] -= 1
+            if refs[digest] == 0:
+                total -= sizes[digest]
+        # 没有 key 再引用的 blob 删除
+        live = {e["digest"] for e in index.values()}
+        folder = os.path.join(self.root, "blobs")
+        if os.path.isdir(folder):
+            for f in os.listdir(folder):
+                if f.endswith(".z") and f[:-2] not in live:
+                    try:
+                        os.remove(os.path.join(folder, f))
+                    except OSError:
+                        pass
+
+
+PAYLOADS = PayloadCache()
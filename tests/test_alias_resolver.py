@@ -0,0 +1,10 @@
+from sheets_parse import alias_resolver
+
+
+def test_resolver_is_shared_across_reruns():
+    """Streamlit 每次 rerun 重新执行脚本：后台线程解析时记下的 ambiguous，下一次 rerun 拿到的实例里也要有"""
+    names = ["Ana Cruz", "Ana Cruz Lopez", "Raul Solis"]
+    alias_resolver(names).resolve("ana cruz lopez")
+    again = alias_resolver(list(names))
+    assert again is alias_resolver(names)
+    assert again.ambiguous == {"ana cruz lopez": ["Ana Cruz", "Ana Cruz Lopez"]}
@@ -0,0 +1,95 @@
+import re
+
+import pytest
+
+import sheets_io
+from sheets_store import PayloadCache
+
+HEADER = ["Consultant", "Candidate", "Onboarding Date", "Candidate Salary", "Payment Date", "Percentage"]
+
+
+def locate(rows):
+    """和 locate_sales_columns 一样的返回格式：付款日期 / 提成比例是会被原地修改的列"""
+    for h, row in enumerate(rows):
+        if row and row[0] == "Consultant":
+            ended = any("POSITION" in " ".join(map(str, r)).upper() for r in rows[h + 1:])
+            return h, set(range(len(HEADER))), {2, 4}, not ended, {4, 5}, {5}
+    return None
+
+
+def paid_rows(rows):
+    """[表头] + 若干行 -> 填了付款日期的候选人"""
+    return [r[1] for r in rows[1:] if len(r) > 4 and r[4]]
+
+
+def column_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+class FakeSheet:
+    """只实现 ProjectedReader 用到的 values:batchGet（整页 / 整行 / 按列）"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.version = 1
+
+    def batch_get_values(self, client, sheet_id, ranges, params=None):
+        out = []
+        for rng in ranges:
+            cells = rng.partition("!")[2]
+            sub = [list(r) for r in self.rows]
+            if cells:
+                c0, r0, c1, r1 = re.fullmatch(r"([A-Z]*)(\d*):([A-Z]*)(\d*)", cells).groups()
+                sub = sub[int(r0) - 1 if r0 else 0:int(r1) if r1 else len(sub)]
+                if c0:
+                    sub = [r[column_index(c0):column_index(c1) + 1] for r in sub]
+            if (params or {}).get("majorDimension") == "COLUMNS":
+                width = max((len(r) for r in sub), default=0)
+                sub = [[r[j] if j < len(r) else "" for r in sub] for j in range(width)]
+                for col in sub:
+                    while col and col[-1] == "":
+                        col.pop()
+            out.append(sub)
+        return out
+
+    def call(self, func, *args, **kwargs):
+        assert func is sheets_io.batch_get_values
+        return self.batch_get_values(*args, **kwargs)
+
+
+@pytest.fixture
+def sheet(tmp_path, monkeypatch):
+    sheet = FakeSheet([["title"], HEADER] + [
+        ["Ana Cruz", f"c{i}", "2025-01-05", "20000", "", "100%"] for i in range(20)])
+    monkeypatch.setattr(sheets_io, "PAYLOADS", PayloadCache(str(tmp_path)))
+    monkeypatch.setattr(sheets_io.CHANGES, "revision", lambda client, sheet_id: str(sheet.version))
+    return sheet
+
+
+def refresh(ledger, sheet):
+    return ledger.refresh(None, sheet.call, paid_rows, lambda old, new: old + new)
+
+
+def test_payment_date_filled_above_tail_window(sheet):
+    ledger = sheets_io.AppendOnlyLedger(sheets_io.ProjectedReader("S", "Positions", locate))
+    assert refresh(ledger, sheet) == []
+
+    sheet.rows[4][4] = "2025-03-01"  # 第 3 条，远在末尾 TAIL_WINDOW 行之前
+    sheet.version += 1
+    assert refresh(ledger, sheet) == ["c2"]
+
+    sheet.rows.append(["Ana Cruz", "c20", "2025-01-06", "20000", "2025-03-02", "100%"])
+    sheet.version += 1
+    assert refresh(ledger, sheet) == ["c2", "c20"]
+
+
+def test_unchanged_ledger_stays_incremental(sheet):
+    ledger = sheets_io.AppendOnlyLedger(sheets_io.ProjectedReader("S", "Positions", locate))
+    refresh(ledger, sheet)
+    sheet.rows.append(["Ana Cruz", "c20", "2025-01-06", "20000", "", "100%"])
+    sheet.version += 1
+    refresh(ledger, sheet)
+    assert ledger._tail_reads == 1
@@ -0,0 +1,73 @@
+import pytest
+
+import sheets_io
+from sheets_store import PayloadCache
+from test_typed_ingest import TypedSheet, locate, parse
+
+
+class FakeHTTP:
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def fetch_sheet_metadata(self, sheet_id):
+        return {"sheets": [{"properties": {"title": "Positions", "sheetId": 0,
+                                           "gridProperties": {"rowCount": 4, "columnCount": 5}}}]}
+
+    def values_batch_get(self, sheet_id, ranges, params=None):
+        values = self.sheet.batch_get_values(None, sheet_id, ranges, params)
+        return {"valueRanges": [{"values": v} for v in values]}
+
+
+class Client:
+    def __init__(self, http):
+        self.http_client = http
+
+
+class Unplugged:
+    """任何请求都直接失败"""
+
+    def __getattr__(self, name):
+        raise AssertionError(f"离线时不应该联网（{name}）")
+
+
+def call(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheets_io, "PAYLOADS", PayloadCache(str(tmp_path)))
+    monkeypatch.setattr(sheets_io.CHANGES, "revision", lambda client, sheet_id: "1")
+    monkeypatch.setattr(sheets_io, "METADATA_CACHE", sheets_io.MetadataCache())
+    return tmp_path
+
+
+def read_ledger(client):
+    ledger = sheets_io.AppendOnlyLedger(sheets_io.ProjectedReader("S", "Positions", locate, typed=True))
+    return ledger.refresh(client, call, parse, lambda old, new: new)
+
+
+def test_offline_parse_uses_only_the_disk_cache(cache, monkeypatch):
+    online = Client(FakeHTTP(TypedSheet()))
+    tabs = sheets_io.get_tabs(online, "S")
+    expected = read_ledger(online)
+
+    # 新进程：内存里什么都没有，网络也不通
+    monkeypatch.setattr(sheets_io, "OFFLINE_PARSE", True)
+    monkeypatch.setattr(sheets_io, "METADATA_CACHE", sheets_io.MetadataCache())
+    offline = Client(Unplugged())
+    assert sheets_io.CHANGES.poll(offline, ["S"]) == set()
+    assert sheets_io.get_tabs(offline, "S") == tabs
+    led = read_ledger(offline)
+    assert led["gp"].tolist() == expected["gp"].tolist()
+    assert led["paid"].tolist() == expected["paid"].tolist()
+    streamed = [r for w in sheets_io.stream_tab(offline, "S", "Positions", call, typed=True, locate=locate) for r in w]
+    assert parse(streamed)["pct"].tolist() == expected["pct"].tolist()
+
+
+def test_offline_parse_without_cache_fails_without_network(cache, monkeypatch):
+    monkeypatch.setattr(sheets_io, "OFFLINE_PARSE", True)
+    offline = Client(Unplugged())
+    with pytest.raises(RuntimeError):
+        sheets_io.get_tabs(offline, "S")
+    assert read_ledger(offline) is None
@@ -0,0 +1,37 @@
+import pytest
+
+import sheets_io
+from sheets_store import PayloadCache
+
+TABS = {"202501": [["Company", "Acme"], ["Name", "a", "b"], ["note", "zz"], ["Stage", "Offer"]]}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheets_io, "PAYLOADS", PayloadCache(str(tmp_path)))
+    monkeypatch.setattr(sheets_io.CHANGES, "revision", lambda client, sheet_id: "1")
+    monkeypatch.setattr(sheets_io, "_CV_PARSED", {})
+    return sheets_io.PAYLOADS
+
+
+def read(missing):
+    values = sheets_io.cached_batch_values(None, "S", [sheets_io.range_name(t) for t in missing],
+                                           lambda rngs: [TABS[sheets_io.split_range(r)[0]] for r in rngs], persist=())
+    return [(rows, True) for rows in values]
+
+
+def keep(rows):
+    return [r for r in rows if r[0] != "note"]
+
+
+def test_cv_tab_is_stored_once(cache):
+    sheets_io.shared_cv_tabs(None, "S", ["202501"], "Name", read, keep, len)
+    keys = sorted(k.split("|")[1] for k in cache._load_index())
+    assert keys == ["'202501'#cv:Name"]
+
+
+def test_offline_parse_uses_the_cv_copy(cache, monkeypatch):
+    sheets_io.shared_cv_tabs(None, "S", ["202501"], "Name", read, keep, len)
+    monkeypatch.setattr(sheets_io, "OFFLINE_PARSE", True)
+    monkeypatch.setattr(sheets_io, "_CV_PARSED", {})
+    assert sheets_io.shared_cv_tabs(None, "S", ["202501"], "Name", None, keep, len) == [3]
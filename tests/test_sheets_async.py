@@ -0,0 +1,148 @@
+import asyncio
+import re
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import sheets_async
+from sheets_async import AsyncAPIError, AsyncSheetsClient
+from sheets_io import RateLimiter
+
+
+def column_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+class StandIn:
+    """本地的 Sheets v4 替身：元数据、values get / batchGet / update，可以排队几个错误响应（限流等）"""
+
+    def __init__(self, books):
+        self.books = books
+        self.errors = []  # [(状态码, error 对象)]，每个请求先取一个
+        self.requests = []
+        self.app = web.Application(middlewares=[self._fail_first])
+        self.app.router.add_get("/v4/spreadsheets/{sid}", self.metadata)
+        self.app.router.add_get("/v4/spreadsheets/{sid}/values:batchGet", self.batch_get)
+        self.app.router.add_get("/v4/spreadsheets/{sid}/values/{rng}", self.values_get)
+        self.app.router.add_put("/v4/spreadsheets/{sid}/values/{rng}", self.update)
+
+    @web.middleware
+    async def _fail_first(self, request, handler):
+        self.requests.append((request.method, request.path))
+        if self.errors:
+            status, error = self.errors.pop(0)
+            return web.json_response({"error": error}, status=status, headers={"Retry-After": "0"})
+        return await handler(request)
+
+    def _cells(self, sid, rng):
+        tab, _, cells = rng.partition("!")
+        rows = self.books[sid][tab.strip("'")]
+        if not cells:
+            return rows
+        c0, r0, c1, r1 = re.fullmatch(r"([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?", cells).groups()
+        c1, r1 = c1 or c0, r1 or r0
+        return [r[column_index(c0):column_index(c1) + 1] for r in rows[int(r0) - 1:int(r1)]]
+
+    async def metadata(self, request):
+        sid = request.match_info["sid"]
+        return web.json_response({"properties": {"title": sid}, "sheets": [
+            {"properties": {"title": t, "sheetId": i}} for i, t in enumerate(self.books[sid])]})
+
+    async def batch_get(self, request):
+        sid = request.match_info["sid"]
+        return web.json_response({"valueRanges": [
+            {"range": r, "values": self._cells(sid, r)} for r in request.query.getall("ranges")]})
+
+    async def values_get(self, request):
+        sid, rng = request.match_info["sid"], request.match_info["rng"]
+        return web.json_response({"range": rng, "values": self._cells(sid, rng)})
+
+    async def update(self, request):
+        sid, rng = request.match_info["sid"], request.match_info["rng"]
+        body = await request.json()
+        tab, _, cells = rng.partition("!")
+        r0, c0 = int(re.search(r"\d+", cells).group()) - 1, column_index(re.match(r"[A-Z]+", cells).group())
+        rows = self.books[sid][tab.strip("'")]
+        for i, row in enumerate(body["values"]):
+            while len(rows) <= r0 + i:
+                rows.append([])
+            target = rows[r0 + i]
+            target.extend([""] * (c0 + len(row) - len(target)))
+            target[c0:c0 + len(row)] = row
+        return web.json_response({"updatedRange": rng, "updatedCells": sum(len(r) for r in body["values"])})
+
+    def run(self, coro_fn):
+        """在新的事件循环里起替身服务，跑 coro_fn(AsyncSheetsClient)"""
+        async def main():
+            async with TestServer(self.app) as server:
+                async with AsyncSheetsClient(None, root=str(server.make_url("/v4/spreadsheets"))) as ac:
+                    return await coro_fn(ac)
+
+        return asyncio.run(main())
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    monkeypatch.setattr(sheets_async, "LIMITER", RateLimiter(rate=100, min_rate=50, max_rate=100))
+    return StandIn({"S": {
+        "Credentials": [["Title", "Team Lead"]],
+        "Positions": [["Consultant", "Salary"], ["Ana Cruz", "20000"], ["Raul Solis", "35000"]],
+    }})
+
+
+def test_open_and_read(standin):
+    async def go(ac):
+        sheet = await ac.open_by_key("S")
+        titles = [w.title for w in await sheet.worksheets()]
+        values = await sheet.values_batch_get(["'Credentials'!A1:B1", "'Positions'"])
+        ws = await sheet.worksheet("Credentials")
+        return sheet.title, titles, values, (await ws.acell("B1")).value
+
+    title, titles, values, role = standin.run(go)
+    assert title == "S"
+    assert titles == ["Credentials", "Positions"]
+    assert values == [[["Title", "Team Lead"]], [["Consultant", "Salary"], ["Ana Cruz", "20000"], ["Raul Solis", "35000"]]]
+    assert role == "Team Lead"
+
+
+def test_get_all_records_and_update(standin):
+    async def go(ac):
+        ws = await (await ac.open_by_key("S")).worksheet("Positions")
+        await ws.update("A4", [["Karina Albarran", 18000]])
+        return await ws.get_all_records()
+
+    assert standin.run(go) == [{"Consultant": "Ana Cruz", "Salary": 20000},
+                               {"Consultant": "Raul Solis", "Salary": 35000},
+                               {"Consultant": "Karina Albarran", "Salary": 18000}]
+
+
+@pytest.mark.parametrize("status, error", [
+    (429, {"status": "RESOURCE_EXHAUSTED", "message": "Quota exceeded"}),
+    (403, {"status": "PERMISSION_DENIED", "errors": [{"reason": "userRateLimitExceeded"}]}),
+])
+def test_throttled_requests_are_retried(standin, status, error):
+    standin.errors = [(status, error)] * 2
+
+    async def go(ac):
+        return (await ac.open_by_key("S")).title
+
+    assert standin.run(go) == "S"
+    assert len(standin.requests) == 3
+    assert sheets_async.LIMITER.throttled == 2
+
+
+def test_other_errors_are_raised(standin):
+    standin.errors = [(403, {"status": "PERMISSION_DENIED", "message": "no access",
+                             "errors": [{"reason": "forbidden"}]})]
+
+    async def go(ac):
+        return await ac.open_by_key("S")
+
+    with pytest.raises(AsyncAPIError) as exc:
+        standin.run(go)
+    assert exc.value.status == 403
+    assert len(standin.requests) == 1
@@ -0,0 +1,114 @@
+import re
+
+import numpy as np
+import pytest
+
+import sheets_io
+from sheets_parse import parse_ledger_chunks
+from sheets_store import PayloadCache
+
+HEADER = ["Consultant", "Onboarding Date", "Candidate Salary", "Payment Date", "Percentage"]
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y"]
+
+# 每格 (UNFORMATTED_VALUE, 表格里显示的文本)
+ROWS = [
+    [("Ana Cruz", "Ana Cruz"), (45658, "2025-01-01"), (25000, "25,000"), (3, "3"), (1.5, "150%")],
+    [("Ana Cruz", "Ana Cruz"), (45659, "2025-01-02"), (10000, "10,000"), (45700, "2025-02-12"), (0.005, "0.50%")],
+    [("Ana Cruz", "Ana Cruz"), (45660, "2025-01-03"), (30000, "30,000"), ("", ""), (50, "50")],
+]
+
+
+def locate(rows):
+    """和 locate_sales_columns 一样的返回格式"""
+    for h, row in enumerate(rows):
+        if row and row[0] == "Consultant":
+            return h, set(range(len(HEADER))), {1, 3}, True, {3, 4}, {4}
+    return None
+
+
+def header(row):
+    if not row or row[0] != "Consultant":
+        return None
+    return {"consultant": 0, "onboard": 1, "salary": 2, "payment": 3, "pct": 4}
+
+
+def column_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+class TypedSheet:
+    """values:batchGet 按 valueRenderOption 返回原始值或显示的文本"""
+
+    def __init__(self):
+        self.cells = [[(h, h) for h in HEADER]] + ROWS
+
+    def batch_get_values(self, client, sheet_id, ranges, params=None):
+        params = params or {}
+        k = 0 if params.get("valueRenderOption") == "UNFORMATTED_VALUE" else 1
+        out = []
+        for rng in ranges:
+            cells = rng.partition("!")[2]
+            sub = [[c[k] for c in r] for r in self.cells]
+            if cells:
+                c0, r0, c1, r1 = re.fullmatch(r"([A-Z]*)(\d*):([A-Z]*)(\d*)", cells).groups()
+                sub = sub[int(r0) - 1 if r0 else 0:int(r1) if r1 else len(sub)]
+                if c0:
+                    sub = [r[column_index(c0):column_index(c1) + 1] for r in sub]
+            if params.get("majorDimension") == "COLUMNS":
+                sub = [list(col) for col in zip(*sub)] if sub else []
+                for col in sub:
+                    while col and col[-1] == "":
+                        col.pop()
+            out.append(sub)
+        return out
+
+    def call(self, func, *args, **kwargs):
+        assert func is sheets_io.batch_get_values
+        return self.batch_get_values(*args, **kwargs)
+
+
+@pytest.fixture
+def sheet(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheets_io, "PAYLOADS", PayloadCache(str(tmp_path)))
+    monkeypatch.setattr(sheets_io.CHANGES, "revision", lambda client, sheet_id: "1")
+    return TypedSheet()
+
+
+def parse(rows):
+    led, _ = parse_ledger_chunks([rows], header, ("consultant", "onboard"), DATE_FORMATS, (",", "$"),
+                                 lambda name: name, payment_dates=True)
+    return led
+
+
+@pytest.mark.parametrize("projected", [False, True])
+def test_typed_read_matches_formatted(sheet, projected):
+    reads = {}
+    for typed in (False, True):
+        reader = sheets_io.ProjectedReader("S", "Positions", locate, typed=typed)
+        rows = reader.read(None, sheet.call)
+        if projected:
+            rows = reader.read(None, sheet.call)
+        reads[typed] = parse(rows)
+    formatted, typed = reads[False], reads[True]
+    np.testing.assert_allclose(typed["pct"], formatted["pct"])
+    np.testing.assert_allclose(typed["gp"], formatted["gp"])
+    assert typed["paid"].tolist() == formatted["paid"].tolist()
+
+
+def test_percent_cells_keep_sheet_meaning(sheet):
+    reader = sheets_io.ProjectedReader("S", "Positions", locate, typed=True)
+    led = parse(reader.read(None, sheet.call))
+    # 150% 不能再除一次 100；0.50% 和 50 按表格里写的文本换算，和 formatted 读取一样
+    np.testing.assert_allclose(led["pct"], [1.5, 0.5, 0.5])
+    assert led["gp"][0] == 25000 * 1.5 * 1.5
+
+
+def test_small_numbers_in_payment_column_are_not_dates(sheet):
+    reader = sheets_io.ProjectedReader("S", "Positions", locate, typed=True)
+    led = parse(reader.read(None, sheet.call))
+    assert led["paid"].tolist() == [False, True, False]
+    assert np.isnat(led["pay_date"][0])
+    assert led["pay_text"][0] == "3"
@@ -0,0 +1,73 @@
+import io
+
+import openpyxl
+import pytest
+
+import sheets_io
+from sheets_store import PayloadCache
+
+
+def xlsx(book):
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for title, rows in book.items():
+        ws = wb.create_sheet(title)
+        for r in rows:
+            ws.append(r)
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+class Response:
+    def __init__(self, content):
+        self.content = content
+
+
+class HTTP:
+    def __init__(self, content):
+        self.content = content
+        self.exports = 0
+
+    def request(self, method, url, params=None):
+        self.exports += 1
+        return Response(self.content)
+
+
+class Client:
+    def __init__(self, http):
+        self.http_client = http
+
+
+def call(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheets_io, "PAYLOADS", PayloadCache(str(tmp_path)))
+    monkeypatch.setattr(sheets_io.CHANGES, "revision", lambda client, sheet_id: "1")
+    monkeypatch.setattr(sheets_io, "WORKBOOK_INGEST", "export")
+    return sheets_io.PAYLOADS
+
+
+def test_export_is_cached_apart_from_values(cache, monkeypatch):
+    client = Client(HTTP(xlsx({"202501": [["Name", "a"]], "202502": [["Name", "b"]], "Notes": [["x"]]})))
+    parsed = []
+    real = sheets_io.read_xlsx
+    monkeypatch.setattr(sheets_io, "read_xlsx", lambda data, tabs=None: parsed.append(tabs) or real(data, tabs))
+    values = sheets_io.cached_workbook_values(client, "S", ["'202501'"], lambda missing: None, call)
+    assert values == [[["Name", "a"]]]
+    assert parsed == [{"202501"}]  # 只解析要的标签页
+    assert cache.get("S", "'202501'", "1") is None  # values 接口的键上没有导出的内容
+    assert cache.get("S", "'202501'#xlsx", "1") == [["Name", "a"]]
+
+    sheets_io.cached_workbook_values(client, "S", ["'202501'"], lambda missing: None, call)
+    assert client.http_client.exports == 1
+
+
+def test_failed_export_falls_back_to_values(cache):
+    client = Client(HTTP(b"not a workbook"))
+    values = sheets_io.cached_workbook_values(client, "S", ["'202501'"], lambda missing: [[["Name", "v"]]], call)
+    assert values == [[["Name", "v"]]]
+    assert cache.get("S", "'202501'", "1") == [["Name", "v"]]